@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Offline benchmarks."""
+
+__all__ = []
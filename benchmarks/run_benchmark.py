@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Offline end-to-end benchmark for WorkAI.research_query.
+
+Runs the full pipeline (Chromium, HTTP fetcher, caches, Groq client) against local
+stand-ins, so results are comparable between commits:
+
+    python -m benchmarks.run_benchmark --queries 10 --output data/bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.stand_ins import StandInConfig, StandInServer
+
+DEFAULT_QUERIES = [
+    "solar panel efficiency",
+    "electric vehicle battery recycling",
+    "ai in medical imaging",
+    "urban heat islands",
+    "quantum error correction",
+    "microplastics in drinking water",
+    "remote work productivity",
+    "coral reef bleaching",
+    "lithium mining impact",
+    "vertical farming economics"
+]
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+async def run_queries(queries: List[str], concurrency: int) -> Dict:
+    # Imported here so the environment pointing WORKAI at the stand-ins is already in place
+    from main import WorkAI
+    from instrumentation import tracer
+
+    workai = WorkAI()
+    slots = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(query: str) -> str:
+        async with slots:
+            started = time.perf_counter()
+            answer = await workai.research_query(query)
+            latencies.append(time.perf_counter() - started)
+            return answer
+
+    started = time.perf_counter()
+    try:
+        answers = await asyncio.gather(*(one(query) for query in queries))
+    finally:
+        await workai.shutdown()
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "failed_answers": sum(1 for answer in answers if "DEEP RESEARCH COMPLETE" not in answer),
+        "stages": tracer.summary(),
+        "fetch_paths": workai.browser.fetch_report()["paths"],
+        "llm_cache": workai.researcher.cache_report(),
+        "rate_limiter": workai.researcher.rate_limiter.stats()
+    }
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Offline WORKAI end-to-end benchmark")
+    parser.add_argument("--queries", type=int, default=len(DEFAULT_QUERIES),
+                        help="number of queries to run")
+    parser.add_argument("--queries-file",
+                        help="file with one query per line (default: built-in list)")
+    parser.add_argument("--concurrency", type=int, default=1, help="research_query jobs in flight")
+    parser.add_argument("--search-latency", type=float, default=0.05)
+    parser.add_argument("--page-latency", type=float, default=0.1)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--page-failure-rate", type=float, default=0.05)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=20000, help="article text size in bytes")
+    parser.add_argument("--js-page-rate", type=float, default=0.1,
+                        help="share of pages rendered client-side")
+    parser.add_argument("--no-answer-rate", type=float, default=0.2)
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="reuse data/bench_cache.sqlite3 between runs")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            pool = [line.strip() for line in f if line.strip()]
+    else:
+        pool = DEFAULT_QUERIES
+    queries = [pool[i % len(pool)] for i in range(args.queries)]
+
+    config = StandInConfig(
+        search_latency=args.search_latency, page_latency=args.page_latency,
+        llm_latency=args.llm_latency, search_failure_rate=args.search_failure_rate,
+        page_failure_rate=args.page_failure_rate, llm_failure_rate=args.llm_failure_rate,
+        page_size=args.page_size, js_page_rate=args.js_page_rate, no_answer_rate=args.no_answer_rate
+    )
+    cache_dir = tempfile.mkdtemp(prefix="workai-bench-")
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_path = (os.path.join(repo_dir, "data", "bench_cache.sqlite3") if args.warm_cache
+                  else os.path.join(cache_dir, "cache.sqlite3"))
+
+    with StandInServer(config) as stand_ins:
+        os.environ.update({
+            "SEARCH_URL": stand_ins.base_url,
+            "GROQ_BASE_URL": stand_ins.base_url,
+            "GROQ_API_KEY": os.getenv("BENCH_GROQ_API_KEY", "offline-benchmark"),
+            "WORKAI_CACHE_PATH": cache_path,
+            "TRACE_DIR": os.path.join(cache_dir, "traces"),
+            "STREAM_OUTPUT": "False",
+            "FETCH_PROFILE": os.getenv("FETCH_PROFILE", "performance"),
+            # The stand-in has no quota; set these to benchmark behaviour under a real one
+            "LLM_REQUESTS_PER_MINUTE": os.getenv("LLM_REQUESTS_PER_MINUTE", "0"),
+            "LLM_TOKENS_PER_MINUTE": os.getenv("LLM_TOKENS_PER_MINUTE", "0"),
+            # Repeated benchmark queries would otherwise be answered from past runs
+            "KNOWLEDGE_INDEX": os.getenv("KNOWLEDGE_INDEX", "False"),
+            "KNOWLEDGE_INDEX_PATH": os.path.join(cache_dir, "knowledge.sqlite3")
+        })
+        run = asyncio.run(run_queries(queries, args.concurrency))
+        counts = dict(stand_ins.counts)
+
+    latencies = sorted(run["latencies"])
+    report = {
+        "revision": git_revision(),
+        "queries": len(queries),
+        "concurrency": args.concurrency,
+        "config": vars(config),
+        "elapsed_s": round(run["elapsed"], 3),
+        "queries_per_minute": (round(60 * len(queries) / run["elapsed"], 2) if run["elapsed"]
+                               else 0.0),
+        "query_latency_s": {
+            "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "p95": (latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies
+                    else 0.0)
+        },
+        "failed_answers": run["failed_answers"],
+        "stages": run["stages"],
+        "llm_calls": {
+            "round_trips": counts["llm"] + counts["llm_stream"],
+            "by_stage": {name: stats["count"] for name, stats in run["stages"].items()
+                         if name.startswith("llm.")}
+        },
+        "llm_cache": run["llm_cache"],
+        "rate_limiter": run["rate_limiter"],
+        "fetch_paths": run["fetch_paths"],
+        "stand_in_requests": counts,
+        "peak_rss_mb": {"python": round(peak_rss_mb(), 1),
+                        "largest_child": round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1)}
+    }
+
+    print("\n📊 WORKAI offline benchmark")
+    print(f"   revision {report['revision']}: {report['queries']} queries "
+          f"in {report['elapsed_s']}s → {report['queries_per_minute']} queries/min")
+    latency = report['query_latency_s']
+    print(f"   query latency p50={latency['p50']:.2f}s p95={latency['p95']:.2f}s")
+    for name, stats in report["stages"].items():
+        print(f"   {name:32} n={stats['count']:4} p50={stats['p50'] * 1000:7.0f}ms "
+              f"p95={stats['p95'] * 1000:7.0f}ms")
+    print(f"   LLM round trips: {report['llm_calls']['round_trips']}, "
+          f"fetch paths: {report['fetch_paths']}")
+    print(f"   peak RSS: {report['peak_rss_mb']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"   report written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
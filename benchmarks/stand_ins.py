@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Local stand-ins for DuckDuckGo, article pages and the Groq chat API of the offline benchmark."""
+import hashlib
+import html
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+PARAGRAPH = (
+    "Researchers reviewing {topic} reported measurable progress in {year}, citing {n} independent "
+    "studies and a survey of {m} practitioners. Analysts noted that adoption of {topic} varies "
+    "widely by region, with regulators publishing updated guidance and industry groups tracking "
+    "outcomes."
+)
+
+
+class StandInConfig:
+    """Latency (seconds), failure rate (0..1) and size knobs for each stand-in"""
+
+    def __init__(self, search_latency=0.05, page_latency=0.1, llm_latency=0.3,
+                 search_failure_rate=0.0, page_failure_rate=0.05, llm_failure_rate=0.0,
+                 page_size=20000, js_page_rate=0.0, no_answer_rate=0.2, results_per_search=8,
+                 seed=0):
+        self.search_latency = search_latency
+        self.page_latency = page_latency
+        self.llm_latency = llm_latency
+        self.search_failure_rate = search_failure_rate
+        self.page_failure_rate = page_failure_rate
+        self.llm_failure_rate = llm_failure_rate
+        self.page_size = page_size
+        self.js_page_rate = js_page_rate
+        self.no_answer_rate = no_answer_rate
+        self.results_per_search = results_per_search
+        self.seed = seed
+
+
+def _stable_fraction(*parts) -> float:
+    """Deterministic 0..1 value so reruns hit the same failures for the same inputs"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) / 0xFFFFFFFF
+
+
+class StandInServer:
+    """One local HTTP server hosting all three stand-ins on different paths.
+
+    /?q=...                         fake DuckDuckGo (search form and h2 result links)
+    /article/<slug>                 static article pages, some rendered client-side
+    /openai/v1/chat/completions     Groq-compatible chat endpoint, with SSE streaming
+    """
+
+    def __init__(self, config: Optional[StandInConfig] = None, host: str = "127.0.0.1",
+                 port: int = 0):
+        self.config = config or StandInConfig()
+        self.host = host
+        self.counts: Dict[str, int] = {"search": 0, "article": 0, "llm": 0, "llm_stream": 0,
+                                       "failures": 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.server.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def should_fail(self, rate: float) -> bool:
+        with self._lock:
+            failed = self._random.random() < rate
+        if failed:
+            self.count("failures")
+        return failed
+
+    # --- content ------------------------------------------------------------
+
+    def search_page(self, query: str) -> str:
+        form = ('<form action="/" method="get"><input name="q" value="{}">'
+                '<button>Search</button></form>')
+        if not query:
+            return f"<html><body>{form.format('')}</body></html>"
+        slug = re.sub(r"\W+", "-", query.lower()).strip("-")
+        results = "".join(
+            f'<div class="result"><h2><a href="{self.base_url}/article/{slug}-{i}">'
+            f"{html.escape(query.title())} - source {i}</a></h2><p>Snippet {i}</p></div>"
+            for i in range(1, self.config.results_per_search + 1)
+        )
+        return f"<html><body>{form.format(html.escape(query))}{results}</body></html>"
+
+    def article_page(self, slug: str) -> str:
+        topic = slug.rsplit("-", 1)[0].replace("-", " ")
+        paragraphs: List[str] = []
+        size = 0
+        while size < self.config.page_size:
+            n = len(paragraphs)
+            paragraph = PARAGRAPH.format(topic=topic, year=2020 + n % 5, n=n + 3, m=100 + 7 * n)
+            paragraphs.append(f"<p>{html.escape(paragraph)}</p>")
+            size += len(paragraph) + 7
+        body = "".join(paragraphs)
+        if _stable_fraction(self.config.seed, "js", slug) < self.config.js_page_rate:
+            # Client-rendered shell: only a real browser sees the text
+            return (
+                '<html><body><div id="root"></div>'
+                "<noscript>You need to enable JavaScript to run this app.</noscript>"
+                "<script>document.getElementById('root').innerHTML = "
+                f"{json.dumps('<article>' + body + '</article>')};</script></body></html>"
+            )
+        return (
+            f"<html><head><title>{html.escape(topic)}</title>"
+            "<link rel='stylesheet' href='/static/site.css'></head>"
+            "<body><nav>Home | World | Tech</nav>"
+            f"<article><h1>{html.escape(topic.title())}</h1>{body}</article>"
+            "<footer>Copyright</footer></body></html>"
+        )
+
+    def completion_text(self, prompt: str) -> str:
+        if "create a comprehensive research plan" in prompt:
+            match = re.search(r'User Query: "(.*)"', prompt)
+            topic = (match.group(1) if match else "topic").rstrip("?")
+            return (
+                f"PRIMARY: {topic}, {topic} overview, {topic} statistics\n"
+                f"SECONDARY: {topic} history, {topic} impact\n"
+                f"VERIFICATION: {topic} criticism, {topic} evidence\n"
+                f"RECENT: {topic} 2024"
+            )
+        items = re.findall(r"^### ITEM (\d+)$", prompt, flags=re.M)
+        if items:
+            return "\n".join(f"### ITEM {number}\n{self.extraction_answer(prompt + number)}"
+                             for number in items)
+        if "Analyze these verification results" in prompt:
+            return ("CONSENSUS: Sources agree on the main figures.\n"
+                    "CONTRADICTIONS: Minor differences in dates.\n"
+                    "RELIABILITY: Moderate to high.\nGAPS: Little regional data.")
+        if "Synthesize this comprehensive analysis" in prompt:
+            return ("🔍 WORKAI DEEP RESEARCH COMPLETE\nExecutive Summary: "
+                    + " ".join(["Findings summarised."] * 60))
+        return self.extraction_answer(prompt)
+
+    def extraction_answer(self, prompt: str) -> str:
+        if _stable_fraction(self.config.seed, "answer", prompt) < self.config.no_answer_rate:
+            return "No clear answer found"
+        return "Reported progress across 12 studies in 2023, with adoption varying by region."
+
+    def _handler_class(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, status: int, body: str,
+                          content_type: str = "text/html; charset=utf-8"):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                config = stand_in.config
+                if parts.path == "/":
+                    stand_in.count("search")
+                    time.sleep(config.search_latency)
+                    if stand_in.should_fail(config.search_failure_rate):
+                        return self.send_body(503, "<html><body>Service unavailable</body></html>")
+                    query = parse_qs(parts.query).get("q", [""])[0]
+                    return self.send_body(200, stand_in.search_page(query))
+                if parts.path.startswith("/article/"):
+                    stand_in.count("article")
+                    time.sleep(config.page_latency)
+                    if stand_in.should_fail(config.page_failure_rate):
+                        return self.send_body(500, "<html><body>Server error</body></html>")
+                    return self.send_body(200, stand_in.article_page(parts.path[len("/article/"):]))
+                return self.send_body(404, "not found", "text/plain")
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self.send_body(404, "not found", "text/plain")
+                length = int(self.headers.get("Content-Length", "0"))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                config = stand_in.config
+                stream = bool(request.get("stream"))
+                stand_in.count("llm_stream" if stream else "llm")
+                time.sleep(config.llm_latency)
+                if stand_in.should_fail(config.llm_failure_rate):
+                    self.send_response(429)
+                    error = {"message": "Rate limit reached", "type": "rate_limit"}
+                    body = json.dumps({"error": error}).encode()
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                prompt = "\n".join(message.get("content", "")
+                                   for message in request.get("messages", []))
+                text = stand_in.completion_text(prompt)
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                         "total_tokens": (len(prompt) + len(text)) // 4}
+                base = {"id": "chatcmpl-bench", "created": int(time.time()),
+                        "model": request.get("model", "mock")}
+                if not stream:
+                    message = {"role": "assistant", "content": text}
+                    completion = dict(base, object="chat.completion", usage=usage, choices=[
+                        {"index": 0, "finish_reason": "stop", "message": message}
+                    ])
+                    return self.send_body(200, json.dumps(completion), "application/json")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for start in range(0, len(text), 16):
+                    delta = {"content": text[start:start + 16]}
+                    chunk = dict(base, object="chat.completion.chunk", choices=[
+                        {"index": 0, "finish_reason": None, "delta": delta}
+                    ])
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(0.002)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        return Handler
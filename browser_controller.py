@@ -3,16 +3,77 @@
 """browser_controller module."""
 import asyncio
 import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
 from playwright.async_api import async_playwright
 from dotenv import load_dotenv
+from cache import PersistentCache, normalize_query, normalize_url
+from content_extractor import CONTENT_SELECTORS, MAIN_CONTENT_SCRIPT, MIN_CONTENT_CHARS
+from http_fetcher import HTTPFetcher
+from instrumentation import tracer
+from source_ranker import SourceRanker
 
 load_dotenv()
 
+# Runs inside the search results page and returns every result title and href at once
+SEARCH_RESULTS_SCRIPT = (
+    "(links, limit) => links.slice(0, limit)"
+    ".map(a => ({title: a.innerText, url: a.getAttribute('href')}))"
+)
+
+# Resources the "performance" fetch profile never downloads; inner_text does not need them
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+BLOCKED_HOSTS = (
+    "doubleclick.net", "googlesyndication.com", "google-analytics.com", "googletagmanager.com",
+    "adservice.google.com", "amazon-adsystem.com", "facebook.net", "scorecardresearch.com",
+    "taboola.com", "outbrain.com", "criteo.com", "hotjar.com", "chartbeat.com", "quantserve.com"
+)
+
 class WorkAIBrowser:
-    def __init__(self):
+    def __init__(self, max_pages=None, profile=None):
         self.browser_context = None
         self.page = None
         self.playwright = None
+        self.max_pages = max(1, max_pages or int(os.getenv("BROWSER_CONCURRENCY", "4")))
+        self.profile = profile or os.getenv("FETCH_PROFILE", "standard")
+        self.performance = self.profile == "performance"
+        self.headless = self.performance or os.getenv("HEADLESS") == "True"
+        self.timeout = int(os.getenv("SEARCH_TIMEOUT", "30000"))
+        self.search_url = os.getenv("SEARCH_URL", "https://duckduckgo.com")
+        self.navigation_timeout = (int(os.getenv("NAVIGATION_TIMEOUT", "12000")) if self.performance
+                                   else self.timeout)
+        self.recycle_after = int(os.getenv("BROWSER_RECYCLE_PAGES", "50"))
+        self._page_uses = {}
+        self.content_limit = int(os.getenv("PAGE_CONTENT_LIMIT", "20000"))
+        # Running totals, so a long-lived service does not keep one record per fetch
+        self.fetch_totals = {"pages": 0, "bytes": 0, "blocked": 0, "requests": 0}
+        self.path_counts = {"cache": 0, "http": 0, "browser": 0}
+        # url → path of the most recent fetches, read by the pipeline
+        self.fetch_paths: OrderedDict[str, str] = OrderedDict()
+        self.fetch_paths_kept = int(os.getenv("FETCH_PATHS_KEPT", "1024"))
+        self._page_stats = {}
+        self.http_fetcher = HTTPFetcher() if os.getenv("HTTP_FIRST", "True") == "True" else None
+        self._pages = []
+        self._idle_pages = []
+        self._page_slots = None
+        self._borrowed = 0
+        self.content_cache = None
+        if os.getenv("PAGE_CACHE", "True") == "True":
+            self.content_cache = PersistentCache(
+                "pages",
+                ttl=float(os.getenv("PAGE_CACHE_TTL", "86400")),
+                max_bytes=int(os.getenv("PAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+            )
+        self.search_cache = None
+        if os.getenv("SEARCH_CACHE", "True") == "True":
+            self.search_cache = PersistentCache(
+                "search",
+                ttl=float(os.getenv("SEARCH_CACHE_TTL", "21600")),
+                max_bytes=32 * 1024 * 1024
+            )
+        self._pending_searches = {}
+        self.source_ranker = SourceRanker.from_env()
 
     def is_valid_url(self, url):
         """Filter out bad or unsafe URLs that cause navigation errors."""
@@ -25,6 +86,13 @@ def is_valid_url(self, url):
         return True
 
     async def start_browser(self):
+        with tracer.span("browser.start_browser", profile=self.profile) as span:
+            started = await self._start_browser()
+            if not started:
+                span["outcome"] = "failed"
+            return started
+
+    async def _start_browser(self):
         try:
             self.playwright = await async_playwright().start()
             chromium = self.playwright.chromium
@@ -35,52 +103,210 @@ async def start_browser(self):
                 self.browser_context = await chromium.launch_persistent_context(
                     user_data_dir=user_data_dir,
                     executable_path=chrome_path if chrome_path else None,
-                    headless=False,
+                    headless=self.headless,
                     slow_mo=1000 if os.getenv("DEBUG") == "True" else 0
                 )
-                self.page = self.browser_context.pages[0] if self.browser_context.pages else await self.browser_context.new_page()
+                pages = self.browser_context.pages
+                self.page = pages[0] if pages else await self.browser_context.new_page()
             else:
                 self.browser_context = await chromium.launch(
-                    headless=False,
+                    headless=self.headless,
                     executable_path=chrome_path if chrome_path else None,
                     slow_mo=1000 if os.getenv("DEBUG") == "True" else 0
                 )
                 self.page = await self.browser_context.new_page()
 
-            timeout = int(os.getenv("SEARCH_TIMEOUT", "30000"))
-            self.page.set_default_timeout(timeout)
-            print("✅ Browser started successfully")
+            await self._prepare_page(self.page)
+            self._pages = [self.page]
+            self._idle_pages = [self.page]
+            self._page_slots = asyncio.Semaphore(self.max_pages)
+            print(f"✅ Browser started successfully "
+                  f"(page pool: {self.max_pages}, profile: {self.profile})")
             return True
         except Exception as e:
             print(f"❌ Failed to start browser: {e}")
             return False
 
+    async def _new_page(self):
+        page = await self.browser_context.new_page()
+        await self._prepare_page(page)
+        self._pages.append(page)
+        return page
+
+    async def prewarm_pages(self):
+        """Open the whole page pool up front so the first queries do not pay for new tabs"""
+        while len(self._pages) < self.max_pages:
+            self._idle_pages.append(await self._new_page())
+
+    @property
+    def borrowed_pages(self) -> int:
+        return self._borrowed
+
+    async def health_check(self):
+        """True while the browser process is connected and an idle page still answers.
+
+        The probed page is taken out of the pool while it is checked, so the probe never races
+        a navigation; when every page is borrowed only the connection is checked.
+        """
+        if not self.browser_context:
+            return False
+        try:
+            is_connected = getattr(self.browser_context, "is_connected", None)
+            if is_connected and not is_connected():
+                return False
+            if self._idle_pages and not self._page_slots.locked():
+                async with self._page_slots:
+                    if self._idle_pages:
+                        page = self._idle_pages.pop()
+                        self._borrowed += 1
+                        try:
+                            await asyncio.wait_for(page.evaluate("1"), timeout=5)
+                        finally:
+                            self._borrowed -= 1
+                            if page in self._pages:
+                                self._idle_pages.append(page)
+            return True
+        except Exception:
+            return False
+
+    async def wait_until_idle(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for every borrowed page to be handed back"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self._borrowed and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.1)
+        return not self._borrowed
+
+    def _retire_page(self, page):
+        """Drop a crashed or worn-out page from the pool; a fresh one is opened on demand"""
+        if page in self._pages:
+            self._pages.remove(page)
+        if page in self._idle_pages:
+            self._idle_pages.remove(page)
+        self._page_stats.pop(page, None)
+        self._page_uses.pop(page, None)
+        if self.page is page:
+            self.page = self._pages[0] if self._pages else None
+
+    async def _recycle_page(self, page):
+        # Pages from Browser.new_page own their context, so closing the page frees the context too
+        self._retire_page(page)
+        try:
+            await page.close()
+        except Exception:
+            pass
+
+    async def _prepare_page(self, page):
+        self._page_uses[page] = 0
+        page.on("crash", lambda crashed: self._retire_page(crashed))
+        page.set_default_timeout(self.timeout)
+        page.set_default_navigation_timeout(self.navigation_timeout)
+        stats = self._page_stats[page] = {"requests": 0, "blocked": 0, "bytes": 0}
+        page.on("requestfinished", lambda request: self._record_transfer(stats, request))
+        if self.performance:
+            await page.route("**/*", lambda route: self._filter_request(stats, route))
+
+    def _is_blocked(self, request):
+        if request.resource_type in BLOCKED_RESOURCE_TYPES:
+            return True
+        host = (urlsplit(request.url).hostname or "").lower()
+        return any(host == blocked or host.endswith("." + blocked) for blocked in BLOCKED_HOSTS)
+
+    async def _filter_request(self, stats, route):
+        if self._is_blocked(route.request):
+            stats["blocked"] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _record_transfer(self, stats, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        stats["requests"] += 1
+        stats["bytes"] += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+
+    def fetch_report(self):
+        """Totals over browser page extractions, plus how many fetches each path served"""
+        return dict(self.fetch_totals, paths=dict(self.path_counts))
+
+    def _record_path(self, url, path, span):
+        self.fetch_paths[url] = span["path"] = path
+        self.fetch_paths.move_to_end(url)
+        while len(self.fetch_paths) > self.fetch_paths_kept:
+            self.fetch_paths.popitem(last=False)
+        self.path_counts[path] += 1
+
+    @asynccontextmanager
+    async def acquire_page(self):
+        """Borrow a page from the pool, opening a new one while under max_pages."""
+        async with self._page_slots:
+            page = self._idle_pages.pop() if self._idle_pages else await self._new_page()
+            self._borrowed += 1
+            try:
+                yield page
+            finally:
+                self._borrowed -= 1
+                if page in self._pages:
+                    self._page_uses[page] += 1
+                    if self.recycle_after and self._page_uses[page] >= self.recycle_after:
+                        await self._recycle_page(page)
+                    else:
+                        self._idle_pages.append(page)
+
     async def duckduckgo_search(self, query):
+        """Search results for query, served from the search cache when a normalized match exists"""
+        with tracer.span("browser.duckduckgo_search", query=query) as span:
+            results = await self._cached_duckduckgo_search(query, span)
+            span["results"] = len(results)
+            if not results:
+                span["outcome"] = "empty"
+            return results
+
+    async def _cached_duckduckgo_search(self, query, span):
+        cache_key = normalize_query(query) or query
+        if self.search_cache:
+            cached = self.search_cache.get_json(cache_key)
+            if cached is not None:
+                print(f"⚡ Cached search results ({len(cached)}) for: {query}")
+                span["source"] = "cache"
+                return cached
+
+        # Identical searches already in flight share one browser round trip
+        pending = self._pending_searches.get(cache_key)
+        if pending:
+            span["source"] = "coalesced"
+            return list(await asyncio.shield(pending))
+        span["source"] = "browser"
+
+        task = asyncio.ensure_future(self._run_duckduckgo_search(query))
+        self._pending_searches[cache_key] = task
         try:
-            await self.page.goto("https://duckduckgo.com")
-            search_box = self.page.locator('input[name="q"]')
-            await search_box.fill(query)
-            await search_box.press("Enter")
-            await self.page.wait_for_selector('h2', timeout=10000)
-            
-            results = []
-            result_elements = await self.page.query_selector_all('h2 a')
-            
-            for i, element in enumerate(result_elements[:8]):  # Get more results to filter
-                try:
-                    text = await element.inner_text()
-                    href = await element.get_attribute('href')
-                    
-                    # Filter valid URLs only
-                    if self.is_valid_url(href):
-                        results.append({
-                            'title': text,
-                            'url': href,
-                            'position': i + 1
-                        })
-                except Exception:
-                    continue
-            
+            results = await asyncio.shield(task)
+        finally:
+            self._pending_searches.pop(cache_key, None)
+        if results and self.search_cache:
+            self.search_cache.set_json(cache_key, results)
+        return list(results)
+
+    async def _run_duckduckgo_search(self, query):
+        try:
+            async with self.acquire_page() as page:
+                await page.goto(self.search_url)
+                search_box = page.locator('input[name="q"]')
+                await search_box.fill(query)
+                await search_box.press("Enter")
+                await page.wait_for_selector('h2', timeout=10000)
+                # All titles and hrefs come back in one round trip
+                # Get more results to filter
+                links = await page.eval_on_selector_all('h2 a', SEARCH_RESULTS_SCRIPT, 8)
+
+            results = [
+                {'title': link['title'], 'url': link['url'], 'position': i + 1}
+                for i, link in enumerate(links)
+                if self.is_valid_url(link['url'])  # Filter valid URLs only
+            ]
+
             print(f"✅ Found {len(results)} valid search results for: {query}")
             return results
         except Exception as e:
@@ -89,70 +315,106 @@ async def duckduckgo_search(self, query):
 
     def get_domain_credibility_score(self, url):
         """Score URLs based on domain credibility"""
-        url_lower = url.lower()
-        
-        # High credibility domains
-        if any(domain in url_lower for domain in ['.edu', '.gov', '.org']):
-            return 10
-        if any(domain in url_lower for domain in ['reuters.com', 'bbc.com', 'apnews.com']):
-            return 9
-        if any(domain in url_lower for domain in ['cnn.com', 'ndtv.com', 'firstpost.com']):
-            return 8
-        if 'wikipedia.org' in url_lower:
-            return 7
-        
-        # Medium credibility
-        if any(domain in url_lower for domain in ['.com', '.in', '.uk']):
-            return 5
-            
-        return 3  # Low credibility
+        return self.source_ranker.credibility(url)
+
+    def rank_search_results(self, search_results):
+        """Order candidate sources by credibility, search position and past domain performance"""
+        return self.source_ranker.rank(search_results)
 
     async def extract_page_content(self, url):
+        with tracer.span("browser.extract_page_content", url=url) as span:
+            content = await self._extract_page_content(url, span)
+            span["chars"] = len(content)
+            if not content and span["outcome"] == "ok":
+                span["outcome"] = "empty"
+            return content
+
+    async def _extract_page_content(self, url, span):
+        cache_key = normalize_url(url)
+        if self.content_cache:
+            cached = self.content_cache.get(cache_key)
+            if cached is not None:
+                self._record_path(url, "cache", span)
+                print(f"⚡ Cache hit ({len(cached)} chars): {url[:50]}...")
+                return cached
+
+        # Fast path: static pages are read with a plain HTTP GET, no browser navigation
+        if self.http_fetcher:
+            content, size = await asyncio.to_thread(self.http_fetcher.fetch_text, url)
+            content = content.strip()[:self.content_limit]
+            if content:
+                self._record_path(url, "http", span)
+                span["bytes"] = size
+                if self.content_cache:
+                    self.content_cache.set(cache_key, content)
+                print(f"✅ Extracted {len(content)} chars via HTTP from: {url[:50]}...")
+                return content
+
         try:
-            await self.page.goto(url, wait_until='domcontentloaded')
-            
-            # Priority selectors for better content extraction
-            content_selectors = [
-                'article',
-                'main', 
-                '.content',
-                '#content',
-                '.post-content',
-                '.entry-content',
-                '.article-content',
-                'body'
-            ]
-            
-            content = ""
-            for selector in content_selectors:
-                try:
-                    element = self.page.locator(selector).first
-                    if await element.count() > 0:
-                        content = await element.inner_text()
-                        if len(content.strip()) > 100:  # Ensure meaningful content
-                            break
-                except Exception:
-                    continue
-            
-            if not content:
-                content = await self.page.locator('body').inner_text()
-            
+            async with self.acquire_page() as page:
+                stats = self._page_stats[page]
+                stats.update(requests=0, blocked=0, bytes=0)
+                await page.goto(url, wait_until='domcontentloaded')
+
+                # Main-content scoring and the selector fallbacks run in the page: one round trip
+                extracted = await page.evaluate(MAIN_CONTENT_SCRIPT,
+                                                [CONTENT_SELECTORS, MIN_CONTENT_CHARS])
+                content = extracted['text']
+                span["method"] = extracted['method']
+                self.fetch_totals["pages"] += 1
+                for key in ("bytes", "blocked", "requests"):
+                    self.fetch_totals[key] += stats[key]
+
             # Clean and limit content
-            content = content.strip()[:5000]
-            print(f"✅ Extracted {len(content)} chars from: {url[:50]}...")
+            content = content.strip()[:self.content_limit]
+            self._record_path(url, "browser", span)
+            span["bytes"], span["blocked"] = stats["bytes"], stats["blocked"]
+            if content and self.content_cache:
+                self.content_cache.set(cache_key, content)
+            print(f"✅ Extracted {len(content)} chars from: {url[:50]}... "
+                  f"({stats['bytes'] / 1024:.0f} KB, {stats['blocked']} blocked)")
             return content
         except Exception as e:
             print(f"❌ Failed to extract content from {url}: {e}")
+            span["outcome"], span["error"] = "error", str(e)[:200]
             return ""
 
     async def close_browser(self):
         try:
-            if self.page:
-                await self.page.close()
-            if self.browser_context:
-                await self.browser_context.close()
+            pages, browser_context = self._pages, self.browser_context
+            self._pages = []
+            self._idle_pages = []
+            self._page_stats = {}
+            self._page_uses = {}
+            self.page = None
+            self.browser_context = None
+            # A crashed browser can fail on close; keep going so playwright is still stopped
+            for page in pages:
+                try:
+                    if not page.is_closed():
+                        await page.close()
+                except Exception:
+                    pass
+            if browser_context:
+                try:
+                    await browser_context.close()
+                except Exception:
+                    pass
             if self.playwright:
                 await self.playwright.stop()
+                self.playwright = None
+            if any(self.path_counts.values()):
+                report = self.fetch_report()
+                print(f"📉 Fetch paths: {report['paths']}; browser pages: {report['pages']}, "
+                      f"{report['bytes'] / 1024:.0f} KB, {report['blocked']} requests blocked")
+            if self.content_cache:
+                stats = self.content_cache.stats()
+                print(f"📦 Page cache: {stats['hits']} hits, {stats['misses']} misses, "
+                      f"{stats['entries']} entries")
+            if self.search_cache:
+                stats = self.search_cache.stats()
+                print(f"📦 Search cache: {stats['hits']} hits, {stats['misses']} misses, "
+                      f"{stats['entries']} entries")
             print("✅ Browser closed successfully")
         except Exception as e:
             print(f"❌ Error closing browser: {e}")
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""browser_manager module."""
+import asyncio
+import os
+from browser_controller import WorkAIBrowser
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class BrowserManager:
+    """Keeps one WorkAIBrowser warm across queries instead of launching Chromium per query.
+
+    The browser is started lazily, health-checked before each use and restarted if it
+    crashed, but only once no other query has a page borrowed. WorkAIBrowser itself
+    recycles pages after BROWSER_RECYCLE_PAGES navigations.
+    """
+
+    def __init__(self, browser=None, prewarm=None):
+        self.browser = browser or WorkAIBrowser()
+        if prewarm is None:
+            prewarm = os.getenv("BROWSER_PREWARM", "True") == "True"
+        self.prewarm = prewarm
+        self.restarts = 0
+        self._started = False
+        self._lock = asyncio.Lock()
+
+    async def ensure_browser(self) -> bool:
+        """Return True once a healthy browser is running, starting or restarting it as needed"""
+        async with self._lock:
+            if self._started and await self.browser.health_check():
+                return True
+            if self._started and self.browser.borrowed_pages:
+                # Other queries are still using pages; closing the browser now would fail them all
+                grace = self.browser.navigation_timeout / 1000 + 5
+                if not await self.browser.wait_until_idle(grace):
+                    print("⚠️ Browser unhealthy but pages are still in use, not restarting")
+                    return False
+                if await self.browser.health_check():
+                    return True
+            if self._started:
+                print("⚠️ Browser unhealthy, restarting...")
+                self.restarts += 1
+                await self.browser.close_browser()
+                self._started = False
+            if not await self.browser.start_browser():
+                return False
+            self._started = True
+            if self.prewarm:
+                try:
+                    await self.browser.prewarm_pages()
+                except Exception as e:
+                    print(f"⚠️ Could not prewarm page pool: {e}")
+            return True
+
+    async def shutdown(self):
+        async with self._lock:
+            if self._started:
+                await self.browser.close_browser()
+                self._started = False
+            if self.browser.http_fetcher:
+                self.browser.http_fetcher.close()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""cache module."""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data",
+                                  "workai_cache.sqlite3")
+
+# Query parameters that never change page content
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref_src")
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a URL: lowercase host, no fragment or tracking params, sorted query"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), host, path, urlencode(query), ""))
+
+
+def normalize_query(query: str) -> str:
+    """Canonical cache key for a search query: case, whitespace, punctuation and term order folded.
+
+    Trailing + and # stay on their word, so "c++", "c#" and "c" remain different queries.
+    """
+    terms = re.findall(r"\w+[+#]*", query.lower())
+    return " ".join(sorted(set(terms)))
+
+
+class PersistentCache:
+    """SQLite-backed key/value cache with TTL and size-bounded LRU eviction.
+
+    Values are zlib-compressed on disk. Several namespaces share one database file,
+    and SQLite's WAL locking keeps the file safe to use from several processes at once.
+    """
+
+    def __init__(self, namespace: str, path: Optional[str] = None, ttl: float = 86400,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.namespace = namespace
+        self.path = path or os.getenv("WORKAI_CACHE_PATH") or DEFAULT_CACHE_PATH
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?",
+                                       (self.namespace, key))
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            self.hits += 1
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(key, value)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def update_json(self, key: str, update):
+        """Replace the value under key with update(current value or None) in one write transaction.
+
+        Other processes sharing the file cannot write in between, so read-modify-write
+        updates such as counters are never lost.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+                ).fetchone()
+                current = None
+                if row is not None and not (self.ttl and time.time() - row[1] > self.ttl):
+                    current = json.loads(zlib.decompress(row[0]).decode("utf-8"))
+                value = update(current)
+                self._write(key, json.dumps(value))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def _write(self, key: str, value: str):
+        blob = zlib.compress(value.encode("utf-8"))
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, size, created_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (self.namespace, key, blob, len(blob), now, now)
+        )
+        self._evict()
+
+    def get_json(self, key: str):
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key: str, value):
+        self.set(key, json.dumps(value))
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        if self.ttl:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND created_at < ?",
+                (self.namespace, time.time() - self.ttl)
+            )
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM cache WHERE namespace = ? ORDER BY accessed_at",
+            (self.namespace,)
+        ):
+            if total <= self.max_bytes:
+                break
+            victims.append((self.namespace, key))
+            total -= size
+        self._conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", victims)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?",
+                (self.namespace,)
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
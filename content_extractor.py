@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""content_extractor module."""
+import re
+from html.parser import HTMLParser
+from typing import List, Optional, Union
+
+# Priority selectors for main content, shared by the browser and HTTP fetch paths
+CONTENT_SELECTORS = [
+    'article',
+    'main',
+    '.content',
+    '#content',
+    '.post-content',
+    '.entry-content',
+    '.article-content',
+    'body'
+]
+
+# Pages with less text than this are treated as empty / JS-rendered
+MIN_CONTENT_CHARS = 100
+
+# Runs inside the page: one evaluate() round trip returns {"text", "method"} for the main content.
+# A readability-style pass scores the ancestors of text blocks by their length and commas,
+# discounts link-heavy and nav/footer-like containers, and keeps the best one; when nothing
+# scores, CONTENT_SELECTORS are tried in order and finally the whole body.
+MAIN_CONTENT_SCRIPT = r"""
+([selectors, minChars]) => {
+  const clean = (text) =>
+    (text || "").replace(/[ \t\f\v\r]+/g, " ").replace(/\s*\n\s*/g, "\n").trim();
+  const NEGATIVE = new RegExp(
+    "comment|footer|footnote|sidebar|widget|nav|menu|banner|promo|share|social|related|" +
+    "cookie|modal|\\bad", "i");
+  const POSITIVE = /article|content|post|entry|main|story|text|body/i;
+  const scores = new Map();
+  for (const block of document.querySelectorAll("p, pre, blockquote, td, li")) {
+    const text = block.innerText || "";
+    if (text.length < 25) continue;
+    const score = 1 + text.split(",").length + Math.min(3, Math.floor(text.length / 100));
+    let node = block.parentElement;
+    for (let level = 0; node && level < 3; level++, node = node.parentElement) {
+      scores.set(node, (scores.get(node) || 0) + score / (level === 0 ? 1 : level * 2));
+    }
+  }
+  let best = null, bestScore = 0;
+  const ranked = [...scores.entries()].sort((a, b) => b[1] - a[1]).slice(0, 8);
+  for (const [node, score] of ranked) {
+    const text = node.innerText || "";
+    let linkChars = 0;
+    for (const link of node.querySelectorAll("a")) linkChars += (link.innerText || "").length;
+    const label = `${node.tagName} ${node.id} ${node.className}`;
+    const weight = (POSITIVE.test(label) ? 1.25 : 1) * (NEGATIVE.test(label) ? 0.25 : 1);
+    const adjusted = score * weight * (1 - linkChars / Math.max(1, text.length));
+    if (adjusted > bestScore) { best = node; bestScore = adjusted; }
+  }
+  if (best) {
+    const text = clean(best.innerText);
+    if (text.length > minChars) return { text, method: "readability" };
+  }
+  for (const selector of selectors) {
+    const element = document.querySelector(selector);
+    const text = element ? clean(element.innerText) : "";
+    if (text.length > minChars) return { text, method: selector };
+  }
+  return { text: clean(document.body ? document.body.innerText : ""), method: "body" };
+}
+"""
+
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head", "iframe"}
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track",
+    "wbr"
+}
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+    "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main",
+    "nav", "ol", "p", "pre", "section", "table", "tr", "ul"
+}
+JS_REQUIRED_MARKERS = re.compile(
+    r"enable javascript|javascript is (?:disabled|required)|requires javascript", re.I
+)
+
+
+class _Element:
+    __slots__ = ("tag", "id", "classes", "children")
+
+    def __init__(self, tag: str, attrs):
+        attrs = dict(attrs)
+        self.tag = tag
+        self.id = attrs.get("id") or ""
+        self.classes = (attrs.get("class") or "").split()
+        self.children: List[Union[_Element, str]] = []
+
+    def matches(self, selector: str) -> bool:
+        if selector.startswith("."):
+            return selector[1:] in self.classes
+        if selector.startswith("#"):
+            return self.id == selector[1:]
+        return self.tag == selector
+
+    def iter(self):
+        yield self
+        for child in self.children:
+            if isinstance(child, _Element):
+                yield from child.iter()
+
+    def text(self) -> str:
+        parts: List[str] = []
+        self._collect(parts)
+        lines = (re.sub(r"[ \t\f\v\r]+", " ", line).strip() for line in "".join(parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+    def _collect(self, parts: List[str]):
+        block = self.tag in BLOCK_TAGS
+        if block:
+            parts.append("\n")
+        for child in self.children:
+            if isinstance(child, _Element):
+                child._collect(parts)
+            else:
+                parts.append(child)
+        if block:
+            parts.append("\n")
+
+
+class _TreeBuilder(HTMLParser):
+    """Tolerant HTML parser building a minimal element tree without non-visible content"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Element("#document", [])
+        self.stack = [self.root]
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip_depth:
+            if tag in SKIPPED_TAGS:
+                self.skip_depth += 1
+            return
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = 1
+            return
+        element = _Element(tag, attrs)
+        self.stack[-1].children.append(element)
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        if not self.skip_depth and tag not in SKIPPED_TAGS:
+            self.stack[-1].children.append(_Element(tag, attrs))
+
+    def handle_endtag(self, tag):
+        if self.skip_depth:
+            if tag in SKIPPED_TAGS:
+                self.skip_depth -= 1
+            return
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.stack[depth].tag == tag:
+                del self.stack[depth:]
+                return
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.stack[-1].children.append(data)
+
+
+def parse_html(html: str):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def extract_main_text(html: str) -> str:
+    """Main text of an HTML document, trying CONTENT_SELECTORS in order like extract_page_content"""
+    root = parse_html(html)
+    elements = list(root.iter())
+    content = ""
+    for selector in CONTENT_SELECTORS:
+        element: Optional[_Element] = next((el for el in elements if el.matches(selector)), None)
+        if element is not None:
+            content = element.text()
+            if len(content.strip()) > MIN_CONTENT_CHARS:
+                break
+    if not content:
+        content = root.text()
+    return content.strip()
+
+
+def needs_browser(html: str, text: str) -> bool:
+    """True when statically extracted text is too thin to trust, e.g. a JS-rendered shell page"""
+    if len(text.strip()) <= MIN_CONTENT_CHARS:
+        return True
+    return bool(JS_REQUIRED_MARKERS.search(html)) and len(text) < 1000
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""dedup module."""
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+from cache import PersistentCache, normalize_query
+
+FINGERPRINT_BITS = 64
+# Eight 8-bit bands: two fingerprints within 7 bits of each other agree exactly on at least one band
+BANDS = 8
+BAND_BITS = FINGERPRINT_BITS // BANDS
+
+
+def shingles(text: str, size: int = 4) -> List[str]:
+    """Overlapping runs of `size` words, lowercased with punctuation stripped"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str, size: int = 4) -> int:
+    """64-bit SimHash over the word shingles of text; near-identical texts differ in a few bits"""
+    digests = (hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+               for shingle in set(shingles(text, size)))
+    hashes = [format(int.from_bytes(digest, "big"), "064b") for digest in digests]
+    if not hashes:
+        return 0
+    half = len(hashes) / 2
+    # zip(*...) walks the bit columns in C; a bit is set when most shingles set it
+    bits = "".join("1" if column.count("1") > half else "0" for column in zip(*hashes))
+    return int(bits, 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def answer_key(search_term: str, search_type: str) -> str:
+    return f"{search_type}|{normalize_query(search_term)}"
+
+
+class NearDuplicateIndex:
+    """Finds pages whose text is a near-duplicate of one already seen.
+
+    Each page is reduced to a SimHash fingerprint and indexed under its eight 8-bit bands,
+    so a lookup only compares against fingerprints that share a band. For every document
+    the index remembers the answers already extracted from it per (search_type, term), which
+    lets a mirrored copy reuse them instead of going back to the LLM. With a PersistentCache
+    store, documents and their answers are also kept across runs.
+    """
+
+    def __init__(self, max_distance: int = 6, min_words: int = 50,
+                 store: Optional[PersistentCache] = None):
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self.store = store
+        self.duplicates = 0
+        self.reused_answers = 0
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+        self._documents: Dict[int, Dict] = {}
+
+    def fingerprint(self, text: str) -> Optional[int]:
+        """SimHash of text, or None when it is too short to fingerprint reliably"""
+        if len(re.findall(r"\w+", text)) < self.min_words:
+            return None
+        return simhash(text)
+
+    def _bands(self, fingerprint: int) -> List[Tuple[int, int]]:
+        mask = (1 << BAND_BITS) - 1
+        return [(band, (fingerprint >> (band * BAND_BITS)) & mask) for band in range(BANDS)]
+
+    def _remember(self, fingerprint: int, document: Dict):
+        if fingerprint in self._documents:
+            return
+        self._documents[fingerprint] = document
+        for band in self._bands(fingerprint):
+            self._buckets.setdefault(band, []).append(fingerprint)
+
+    def _stored_candidates(self, store: PersistentCache, fingerprint: int) -> List[int]:
+        candidates = []
+        for band, value in self._bands(fingerprint):
+            for entry in store.get_json(f"band:{band}:{value:02x}") or []:
+                candidates.append(int(entry, 16))
+        return candidates
+
+    def lookup(self, fingerprint: int) -> Optional[Tuple[int, Dict]]:
+        """Closest indexed (fingerprint, document) within max_distance bits, or None"""
+        candidates = {match for band in self._bands(fingerprint)
+                      for match in self._buckets.get(band, [])}
+        close = any(hamming_distance(fingerprint, match) <= self.max_distance
+                    for match in candidates)
+        if self.store and not close:
+            candidates.update(self._stored_candidates(self.store, fingerprint))
+        matches = sorted(
+            (hamming_distance(fingerprint, candidate), candidate) for candidate in candidates
+            if hamming_distance(fingerprint, candidate) <= self.max_distance
+        )
+        for _, match in matches:
+            document = self._documents.get(match)
+            if document is None and self.store:
+                document = self.store.get_json(f"doc:{match:016x}")
+                if document is not None:
+                    self._remember(match, document)
+            if document is not None:
+                self.duplicates += 1
+                return match, document
+        return None
+
+    def add(self, fingerprint: int, url: str) -> Dict:
+        document = {"url": url, "answers": {}}
+        self._remember(fingerprint, document)
+        if self.store:
+            for band, value in self._bands(fingerprint):
+                key = f"band:{band}:{value:02x}"
+                # Bounded so a very common band value cannot grow without limit
+                entry = f"{fingerprint:016x}"
+                self.store.update_json(
+                    key, lambda entries: [e for e in entries or [] if e != entry][-199:] + [entry]
+                )
+            self.store.set_json(f"doc:{fingerprint:016x}", document)
+        return self._documents[fingerprint]
+
+    def answer(self, fingerprint: int, search_term: str, search_type: str) -> Optional[str]:
+        document = self._documents.get(fingerprint)
+        answer = document["answers"].get(answer_key(search_term, search_type)) if document else None
+        if answer is not None:
+            self.reused_answers += 1
+        return answer
+
+    def record_answer(self, fingerprint: int, search_term: str, search_type: str, answer: str):
+        document = self._documents.get(fingerprint)
+        if document is None:
+            return
+        document["answers"][answer_key(search_term, search_type)] = answer
+        if self.store:
+            self.store.set_json(f"doc:{fingerprint:016x}", document)
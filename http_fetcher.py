@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""http_fetcher module."""
+import os
+from typing import Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from content_extractor import extract_main_text, needs_browser
+
+load_dotenv()
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+
+class HTTPFetcher:
+    """Plain pooled HTTP fetch path for static pages, tried before a full browser navigation."""
+
+    def __init__(self, pool_size=None, timeout=None, max_bytes=None):
+        pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", "10"))
+        self.timeout = timeout or float(os.getenv("HTTP_TIMEOUT", "8"))
+        self.max_bytes = max_bytes or int(os.getenv("HTTP_MAX_BYTES", str(2 * 1024 * 1024)))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5",
+            "Accept-Encoding": "gzip, deflate",
+            "Accept-Language": "en-US,en;q=0.8",
+            "Connection": "keep-alive"
+        })
+
+    def fetch_html(self, url: str) -> Optional[Tuple[bytes, str]]:
+        """(body truncated at max_bytes, encoding) for an HTML page; None for errors and non-HTML"""
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True,
+                                  allow_redirects=True) as response:
+                content_type = response.headers.get("Content-Type", "").lower()
+                if response.status_code != 200 or "html" not in content_type:
+                    return None
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    body.extend(chunk)
+                    if len(body) >= self.max_bytes:
+                        del body[self.max_bytes:]
+                        break
+                encoding = response.encoding if "charset" in content_type else None
+                return bytes(body), encoding or "utf-8"
+        except Exception:
+            return None
+
+    def fetch_text(self, url: str) -> Tuple[str, int]:
+        """(main article text, bytes downloaded) via plain HTTP; "" when the page needs a browser"""
+        fetched = self.fetch_html(url)
+        if not fetched:
+            return "", 0
+        body, encoding = fetched
+        try:
+            html = body.decode(encoding, errors="replace")
+        except LookupError:  # bogus charset in Content-Type
+            html = body.decode("utf-8", errors="replace")
+        text = extract_main_text(html)
+        return ("" if needs_browser(html, text) else text), len(body)
+
+    def close(self):
+        self.session.close()
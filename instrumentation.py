@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""instrumentation module."""
+import asyncio
+import contextvars
+import json
+import os
+import re
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional, Sequence
+
+DEFAULT_TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "traces")
+
+# Span attributes summed per span name in summaries
+SUMMED_ATTRS = ("bytes", "prompt_tokens", "completion_tokens")
+
+_current_trace: contextvars.ContextVar[Optional[QueryTrace]] = contextvars.ContextVar(
+    "workai_trace", default=None
+)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of values (fraction in 0..1)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+class QueryTrace:
+    """Spans recorded while answering one query"""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[Dict] = []
+        self._lanes: Dict[int, int] = {}
+
+    def lane(self) -> int:
+        """Small stable id for the running asyncio task, used as the Chrome trace thread"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return self._lanes.setdefault(id(task), len(self._lanes) + 1)
+
+    def tokens(self) -> int:
+        """Prompt + completion tokens of the LLM calls finished so far"""
+        return sum(
+            span["attrs"].get(key, 0) for span in self.spans
+            for key in ("prompt_tokens", "completion_tokens")
+            if isinstance(span["attrs"].get(key), (int, float))
+        )
+
+    def to_json(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "query": self.query,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "spans": self.spans,
+            "summary": summarize(self.spans)
+        }
+
+    def to_chrome_trace(self) -> Dict:
+        """Trace Event Format, loadable in chrome://tracing or Perfetto"""
+        return {
+            "traceEvents": [
+                {
+                    "name": span["name"],
+                    "cat": span["name"].split(".")[0],
+                    "ph": "X",
+                    "ts": span["start"] * 1e6,
+                    "dur": span["duration"] * 1e6,
+                    "pid": 1,
+                    "tid": span["lane"],
+                    "args": span["attrs"]
+                }
+                for span in self.spans
+            ],
+            "displayTimeUnit": "ms",
+            "otherData": {"query": self.query, "trace_id": self.trace_id}
+        }
+
+    def export(self, directory: str) -> List[str]:
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"\W+", "-", self.query.lower()).strip("-")[:40] or "query"
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))
+        base = os.path.join(directory, f"{stamp}-{slug}-{self.trace_id}")
+        paths = [f"{base}.json", f"{base}.trace.json"]
+        with open(paths[0], "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2, ensure_ascii=False)
+        with open(paths[1], "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+        return paths
+
+
+def summarize(spans: Sequence[Dict]) -> Dict[str, Dict]:
+    """Per span name: count, error count, p50/p95/total wall time and summed bytes/tokens"""
+    summary: Dict[str, Dict] = {}
+    for name in sorted({span["name"] for span in spans}):
+        matching = [span for span in spans if span["name"] == name]
+        durations = [span["duration"] for span in matching]
+        entry = {
+            "count": len(matching),
+            "errors": sum(1 for span in matching
+                          if span["attrs"].get("outcome") not in ("ok", "cached")),
+            "p50": percentile(durations, 0.5),
+            "p95": percentile(durations, 0.95),
+            "total": sum(durations)
+        }
+        for key in SUMMED_ATTRS:
+            values = [span["attrs"][key] for span in matching
+                      if isinstance(span["attrs"].get(key), (int, float))]
+            if values:
+                entry[key] = sum(values)
+        summary[name] = entry
+    return summary
+
+
+class Tracer:
+    """Collects timing spans per query and across the whole process.
+
+    Spans opened while a query() block is active (including in tasks it spawns) belong
+    to that query's trace, which is exported as JSON and Chrome-trace files when the
+    block exits and is not kept afterwards. The process-wide p50/p95 summary covers the
+    last max_spans spans, so a long-running service does not grow without limit.
+    """
+
+    def __init__(self, trace_dir: Optional[str] = None, export: Optional[bool] = None,
+                 max_spans: Optional[int] = None):
+        self.trace_dir = trace_dir or os.getenv("TRACE_DIR") or DEFAULT_TRACE_DIR
+        self.export = export if export is not None else os.getenv("TRACE_EXPORT", "True") == "True"
+        max_spans = max_spans or int(os.getenv("TRACE_MAX_SPANS", "10000"))
+        self.spans: Deque[Dict] = deque(maxlen=max_spans)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time a block; the yielded dict takes extra attributes (bytes, tokens, outcome, ...)"""
+        trace = _current_trace.get()
+        start = time.perf_counter()
+        attrs.setdefault("outcome", "ok")
+        try:
+            yield attrs
+        except asyncio.CancelledError:
+            attrs["outcome"] = "cancelled"
+            raise
+        except Exception as e:
+            attrs["outcome"] = "error"
+            attrs["error"] = str(e)[:200]
+            raise
+        finally:
+            end = time.perf_counter()
+            record = {
+                "name": name,
+                "start": start - trace.origin if trace else 0.0,
+                "duration": end - start,
+                "lane": trace.lane() if trace else 0,
+                "attrs": attrs
+            }
+            self.spans.append(record)
+            if trace:
+                trace.spans.append(record)
+
+    @contextmanager
+    def query(self, user_query: str):
+        trace = QueryTrace(user_query)
+        token = _current_trace.set(trace)
+        try:
+            with self.span("research_query", query=user_query):
+                yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.duration = time.perf_counter() - trace.origin
+            if self.export:
+                try:
+                    trace.export(self.trace_dir)
+                except OSError as e:
+                    print(f"⚠️ Could not export trace: {e}")
+
+    def current(self) -> Optional[QueryTrace]:
+        """Trace of the query() block the caller is running in, if any"""
+        return _current_trace.get()
+
+    def summary(self) -> Dict[str, Dict]:
+        return summarize(self.spans)
+
+    def print_summary(self):
+        for name, entry in self.summary().items():
+            extras = "".join(f", {key}={entry[key]}" for key in SUMMED_ATTRS if key in entry)
+            print(f"   ⏱️ {name}: n={entry['count']} p50={entry['p50'] * 1000:.0f}ms "
+                  f"p95={entry['p95'] * 1000:.0f}ms errors={entry['errors']}{extras}")
+
+
+tracer = Tracer()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""knowledge_index module."""
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+from passage_ranker import tokenize
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data",
+                                  "workai_knowledge.sqlite3")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS documents ("
+    " id INTEGER PRIMARY KEY, kind TEXT NOT NULL, search_type TEXT NOT NULL,"
+    " search_term TEXT NOT NULL, body BLOB NOT NULL, source TEXT NOT NULL, query_id INTEGER,"
+    " length INTEGER NOT NULL, created_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS documents_kind ON documents (kind, search_type, created_at)",
+    "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, id INTEGER NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS postings ("
+    " term_id INTEGER NOT NULL, doc_id INTEGER NOT NULL, tf INTEGER NOT NULL,"
+    " PRIMARY KEY (term_id, doc_id)) WITHOUT ROWID"
+)
+
+
+def format_age(seconds: float) -> str:
+    if seconds < 3600:
+        return f"{max(1, round(seconds / 60))} min"
+    if seconds < 86400:
+        return f"{round(seconds / 3600)} h"
+    return f"{round(seconds / 86400)} days"
+
+
+def overlap(a: str, b: str) -> float:
+    """Jaccard similarity of the content words of two queries"""
+    terms_a, terms_b = set(tokenize(a)), set(tokenize(b))
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+class KnowledgeIndex:
+    """Persistent BM25 inverted index over past research.
+
+    Two kinds of documents are kept: 'query' (a user query and its final answer) and
+    'finding' (one search term's answer, its layer and source). Bodies are stored
+    zlib-compressed, and postings use integer term ids in a WITHOUT ROWID table keyed by
+    (term_id, doc_id), so a lookup reads only the posting lists of the query's terms.
+
+    cached_answer() and reusable_finding() return a stored document only when it is fresh
+    enough and its query or term shares at least min_overlap of its words with the new one.
+    """
+
+    def __init__(self, path: Optional[str] = None, answer_max_age: float = 3 * 86400,
+                 finding_max_age: float = 7 * 86400, recent_max_age: float = 86400,
+                 min_overlap: float = 0.8):
+        self.path = path or os.getenv("KNOWLEDGE_INDEX_PATH") or DEFAULT_INDEX_PATH
+        self.answer_max_age = answer_max_age
+        self.finding_max_age = finding_max_age
+        self.recent_max_age = recent_max_age
+        self.min_overlap = min_overlap
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+
+    @classmethod
+    def from_env(cls) -> Optional["KnowledgeIndex"]:
+        if os.getenv("KNOWLEDGE_INDEX", "True") != "True":
+            return None
+        return cls(
+            answer_max_age=float(os.getenv("KNOWLEDGE_ANSWER_MAX_AGE", str(3 * 86400))),
+            finding_max_age=float(os.getenv("KNOWLEDGE_FINDING_MAX_AGE", str(7 * 86400))),
+            recent_max_age=float(os.getenv("KNOWLEDGE_RECENT_MAX_AGE", "86400")),
+            min_overlap=float(os.getenv("KNOWLEDGE_MIN_OVERLAP", "0.8"))
+        )
+
+    # --- writing ------------------------------------------------------------
+
+    def _term_ids(self, terms) -> Dict[str, int]:
+        ids = {}
+        for term in terms:
+            row = self._conn.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()
+            if row is None:
+                next_id = self._conn.execute(
+                    "SELECT COALESCE(MAX(id), 0) + 1 FROM terms"
+                ).fetchone()[0]
+                self._conn.execute("INSERT INTO terms (term, id) VALUES (?, ?)", (term, next_id))
+                row = (next_id,)
+            ids[term] = row[0]
+        return ids
+
+    def _add(self, kind: str, search_term: str, body: str, indexed: str, search_type: str = "",
+             source: str = "", query_id: Optional[int] = None,
+             created_at: Optional[float] = None) -> int:
+        counts = Counter(tokenize(indexed))
+        cursor = self._conn.execute(
+            "INSERT INTO documents"
+            " (kind, search_type, search_term, body, source, query_id, length, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, search_type, search_term, zlib.compress(body.encode("utf-8")), source, query_id,
+             sum(counts.values()), created_at or time.time())
+        )
+        doc_id = cursor.lastrowid
+        assert doc_id is not None  # set by every successful INSERT
+        ids = self._term_ids(counts)
+        self._conn.executemany(
+            "INSERT INTO postings (term_id, doc_id, tf) VALUES (?, ?, ?)",
+            [(ids[term], doc_id, tf) for term, tf in counts.items()]
+        )
+        return doc_id
+
+    def record_research(self, user_query: str, answer: str, all_results: Dict[str, List[Dict]],
+                        created_at: Optional[float] = None) -> int:
+        """Index a finished research run: the query with its answer, and each answered finding"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                query_id = self._add("query", user_query, answer, user_query, created_at=created_at)
+                for search_type, results in all_results.items():
+                    for result in results:
+                        self._add("finding", result['search_term'], result['answer'],
+                                  f"{result['search_term']}\n{result['answer']}",
+                                  search_type=search_type, source=result.get('source', ""),
+                                  query_id=query_id, created_at=created_at)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return query_id
+
+    # --- reading ------------------------------------------------------------
+
+    def search(self, text: str, kind: str, search_type: Optional[str] = None,
+               max_age: Optional[float] = None, limit: int = 5, k1: float = 1.5,
+               b: float = 0.75) -> List[Dict]:
+        """Best BM25 matches for text among documents of one kind (and layer); newer wins ties"""
+        terms = set(tokenize(text))
+        if not terms:
+            return []
+        since = time.time() - max_age if max_age is not None else 0.0
+        layer_filter = " AND search_type = ?" if search_type is not None else ""
+        layer_args = (search_type,) if search_type is not None else ()
+        with self._lock:
+            total, avg_length = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(AVG(length), 0) FROM documents"
+                f" WHERE kind = ?{layer_filter}",
+                (kind,) + layer_args
+            ).fetchone()
+            if not total:
+                return []
+            scores: Dict[int, float] = {}
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length, d.created_at FROM terms t"
+                    " JOIN postings p ON p.term_id = t.id JOIN documents d ON d.id = p.doc_id"
+                    f" WHERE t.term = ? AND d.kind = ?{layer_filter}",
+                    (term, kind) + layer_args
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+                for doc_id, tf, length, created_at in rows:
+                    if created_at < since:
+                        continue
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (
+                        tf + k1 * (1 - b + b * length / (avg_length or 1)))
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            documents = []
+            for doc_id, score in best:
+                row = self._conn.execute(
+                    "SELECT kind, search_type, search_term, body, source, query_id, created_at"
+                    " FROM documents WHERE id = ?",
+                    (doc_id,)
+                ).fetchone()
+                documents.append({
+                    "id": doc_id, "kind": row[0], "search_type": row[1], "search_term": row[2],
+                    "text": zlib.decompress(row[3]).decode("utf-8"), "source": row[4],
+                    "query_id": row[5], "created_at": row[6], "score": score
+                })
+        return sorted(documents, key=lambda doc: (doc["score"], doc["created_at"]), reverse=True)
+
+    def _best_match(self, text: str, candidates: List[Dict]) -> Optional[Dict]:
+        matches = [doc for doc in candidates
+                   if overlap(text, doc["search_term"]) >= self.min_overlap]
+        if not matches:
+            return None
+        return max(matches, key=lambda doc: (overlap(text, doc["search_term"]), doc["created_at"]))
+
+    def cached_answer(self, user_query: str) -> Optional[Dict]:
+        """A fresh final answer to a past query that matches this one"""
+        candidates = self.search(user_query, "query", max_age=self.answer_max_age, limit=20)
+        return self._best_match(user_query, candidates)
+
+    def reusable_finding(self, search_type: str, search_term: str) -> Optional[Dict]:
+        """A fresh finding for a matching term in the same layer; 'recent' ones go stale sooner"""
+        max_age = self.recent_max_age if search_type == 'recent' else self.finding_max_age
+        candidates = self.search(search_term, "finding", search_type, max_age=max_age, limit=20)
+        return self._best_match(search_term, candidates)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT kind, COUNT(*) FROM documents GROUP BY kind"
+            ).fetchall())
+            terms = self._conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        return {"queries": counts.get("query", 0), "findings": counts.get("finding", 0),
+                "terms": terms}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
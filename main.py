@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 """main module."""
+import argparse
 import asyncio
 import os
-from typing import List, Dict
+import time
+from typing import Optional
 from browser_controller import WorkAIBrowser
-from research_agent import WorkAIResearcher
+from browser_manager import BrowserManager
+from cache import PersistentCache
+from research_agent import SUCCESS_MARKER, AsyncWorkAIResearcher
+from pipeline import ResearchPipeline
+from instrumentation import tracer
+from knowledge_index import KnowledgeIndex, format_age
+from service import ResearchService
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,94 +21,99 @@
 class WorkAI:
     def __init__(self):
         self.browser = WorkAIBrowser()
-        self.researcher = WorkAIResearcher()
+        self.browser_manager = BrowserManager(self.browser)
+        self.researcher = AsyncWorkAIResearcher()
+        self.max_sources = int(os.getenv("MAX_SOURCES_PER_TERM", "4"))
+        self.hedge_fanout = max(1, int(os.getenv("HEDGE_FANOUT", "2")))
+        self.hedge_delay = float(os.getenv("HEDGE_DELAY", "4"))
+        self.term_deadline = float(os.getenv("TERM_DEADLINE", "45"))
+        self.batch_extraction = os.getenv("BATCH_EXTRACTION", "False") == "True"
+        self.stream_output = os.getenv("STREAM_OUTPUT", "True") == "True"
+        self.knowledge = KnowledgeIndex.from_env()
+        self.adaptive_depth = os.getenv("ADAPTIVE_DEPTH", "False") == "True"
+        self.confidence_threshold = float(os.getenv("CONFIDENCE_THRESHOLD", "80"))
+        self.query_time_budget = float(os.getenv("QUERY_TIME_BUDGET", "0"))
+        self.query_token_budget = int(os.getenv("QUERY_TOKEN_BUDGET", "0"))
+        self.near_duplicates = os.getenv("NEAR_DUPLICATE_DETECTION", "True") == "True"
+        self.dedup_store = None
+        if self.near_duplicates and os.getenv("DEDUP_PERSIST", "False") == "True":
+            self.dedup_store = PersistentCache(
+                "dedup",
+                ttl=float(os.getenv("DEDUP_PERSIST_TTL", str(7 * 86400))),
+                max_bytes=int(os.getenv("DEDUP_PERSIST_MAX_MB", "32")) * 1024 * 1024,
+            )
 
-    async def conduct_deep_research(self, search_terms: List[str], search_type: str) -> List[Dict]:
-        """Conduct research for a specific search type"""
-        results = []
-        
-        for search_term in search_terms:
-            print(f"   🔎 [{search_type.upper()}] Researching: {search_term}")
-            
-            search_results = await self.browser.duckduckgo_search(search_term)
-            if not search_results:
-                results.append({
-                    "search_term": search_term,
-                    "answer": "No search results found",
-                    "search_type": search_type
-                })
-                continue
-            
-            # Try multiple sources for better coverage
-            answer_found = False
-            for i, result in enumerate(search_results[:4]):  # Check top 4 results
-                try:
-                    content = await self.browser.extract_page_content(result['url'])
-                    if content:
-                        answer = self.researcher.extract_answer_from_content(content, search_term, search_type)
-                        if "No clear answer found" not in answer:
-                            results.append({
-                                "search_term": search_term,
-                                "answer": answer,
-                                "source": result['url'],
-                                "search_type": search_type
-                            })
-                            answer_found = True
-                            break
-                except Exception as e:
-                    print(f"   ⚠️ Skipping {result['url']}: {e}")
-                    continue
-            
-            if not answer_found:
-                results.append({
-                    "search_term": search_term,
-                    "answer": "Could not find reliable answer",
-                    "search_type": search_type
-                })
-        
-        return results
+    async def research_query(self, user_query: str, stream: bool = False) -> str:
+        """Run the full deep research flow and return the final answer.
 
-    async def research_query(self, user_query: str) -> str:
+        With stream=True the answer (or failure message) has already been written to the
+        terminal by the time it is returned.
+        """
+        with tracer.query(user_query):
+            return await self._research_query(user_query, stream)
+
+    async def _research_query(self, user_query: str, stream: bool) -> str:
         print(f"🔍 WORKAI Deep Research Starting...")
         print(f"📝 Query: {user_query}")
         print("=" * 60)
-        
+
         try:
+            known = self.answer_from_knowledge(user_query, stream)
+            if known:
+                return known
+
             print("1️⃣ Starting browser...")
-            browser_started = await self.browser.start_browser()
+            browser_started = await self.browser_manager.ensure_browser()
             if not browser_started:
-                return "❌ Failed to start browser. Please try again."
-            
-            print("2️⃣ Creating deep research plan...")
-            search_plan = self.researcher.break_down_query(user_query)
-            
-            print("3️⃣ Conducting multi-layer research...")
-            all_results = {}
-            
-            # Research each layer
-            for search_type, terms in search_plan.items():
-                if terms:
-                    print(f"\n🔍 Layer: {search_type.upper()}")
-                    results = await self.conduct_deep_research(terms, search_type)
-                    all_results[search_type] = results
-            
-            print("\n4️⃣ Analyzing contradictions and verifying facts...")
-            verification_results = all_results.get('verification', [])
-            contradiction_analysis = self.researcher.analyze_contradictions(verification_results)
-            
-            print("5️⃣ Synthesizing comprehensive answer...")
-            final_answer = self.researcher.synthesize_comprehensive_answer(
-                user_query, all_results, contradiction_analysis
-            )
-            
-            return final_answer
-            
+                return self._report_failure("❌ Failed to start browser. Please try again.", stream)
+
+            pipeline = ResearchPipeline(self)
+            answer = await pipeline.run(user_query, stream=stream)
+            if self.knowledge and SUCCESS_MARKER in answer:
+                self.knowledge.record_research(user_query, answer, pipeline.new_results())
+            return answer
+
         except Exception as e:
             print(f"❌ Deep research failed: {e}")
-            return f"Sorry, deep research failed due to: {str(e)}"
-        
-        finally:
-            await self.browser.close_browser()
+            return self._report_failure(f"Sorry, deep research failed due to: {str(e)}", stream)
+
+    def answer_from_knowledge(self, user_query: str, stream: bool) -> Optional[str]:
+        """Stored answer to a fresh, near-identical past query, if the knowledge index has one"""
+        if not self.knowledge:
+            return None
+        with tracer.span("knowledge.lookup") as span:
+            known = self.knowledge.cached_answer(user_query)
+            span["hit"] = known is not None
+        if not known:
+            return None
+        age = format_age(time.time() - known['created_at'])
+        print(f"📚 Answering from local knowledge: researched {age} ago "
+              f"as \"{known['search_term']}\"")
+        if stream:
+            print("=" * 60)
+            print(known['text'])
+        return known['text']
+
+    def _report_failure(self, message: str, stream: bool) -> str:
+        if stream:
+            print(message)
+        return message
+
+    async def shutdown(self):
+        """Close the warm browser kept alive between queries"""
+        await self.browser_manager.shutdown()
+        if tracer.spans:
+            print("📈 Timing summary:")
+            tracer.print_summary()
+        limits = self.researcher.rate_limiter.stats()
+        if limits["rate_limited"] or limits["retries"]:
+            print(f"🚦 Groq rate limits: {limits['rate_limited']} rate-limited, "
+                  f"{limits['retries']} retries, {limits['waited']}s queued, "
+                  f"concurrency now {limits['limit']}/{limits['max_concurrency']}")
+        report = self.researcher.cache_report()
+        if report["enabled"]:
+            print(f"📦 LLM cache: {report['hits']} hits, {report['misses']} misses "
+                  f"({report['hit_ratio']:.0%}), {report['tokens_saved']} tokens saved")
 
     async def interactive_mode(self):
         print("🤖 WORKAI - Advanced AI Research Assistant")
@@ -120,9 +133,10 @@ async def interactive_mode(self):
                     continue
                 
                 print("\n" + "="*60)
-                answer = await self.research_query(user_input)
+                answer = await self.research_query(user_input, stream=self.stream_output)
                 print("="*60)
-                print(f"{answer}\n")
+                if not self.stream_output:
+                    print(f"{answer}\n")
                 
             except KeyboardInterrupt:
                 print("\n👋 Goodbye!")
@@ -130,16 +144,44 @@ async def interactive_mode(self):
             except Exception as e:
                 print(f"❌ Error: {e}")
 
-async def main():
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="WORKAI deep research assistant")
+    parser.add_argument("query", nargs="*",
+                        help="research this query and exit (default: interactive mode)")
+    parser.add_argument("--batch", metavar="INPUT_JSONL",
+                        help="research every query in a JSONL file")
+    parser.add_argument("--output", metavar="OUTPUT_JSONL", default="results.jsonl",
+                        help="where --batch appends results")
+    parser.add_argument("--serve", action="store_true", help="run the local HTTP research service")
+    parser.add_argument("--host", default=os.getenv("SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", "8765")))
+    parser.add_argument("--concurrency", type=int,
+                        help="research queries in flight (default: RESEARCH_CONCURRENCY)")
+    args = parser.parse_args(argv)
+
+    if (args.batch or args.serve) and "TRACE_EXPORT" not in os.environ:
+        # Two trace files per query add up quickly in a long-running service;
+        # opt in with TRACE_EXPORT=True
+        tracer.export = False
     workai = WorkAI()
-    
-    import sys
-    if len(sys.argv) > 1:
-        query = " ".join(sys.argv[1:])
-        answer = await workai.research_query(query)
-        print(f"\n🤖 WORKAI Deep Research:\n{answer}")
-    else:
-        await workai.interactive_mode()
+    try:
+        if args.batch or args.serve:
+            service = ResearchService(workai, args.concurrency)
+            if args.batch:
+                await service.run_batch(args.batch, args.output)
+            else:
+                await service.serve(args.host, args.port)
+        elif args.query:
+            query = " ".join(args.query)
+            if workai.stream_output:
+                await workai.research_query(query, stream=True)
+            else:
+                answer = await workai.research_query(query)
+                print(f"\n🤖 WORKAI Deep Research:\n{answer}")
+        else:
+            await workai.interactive_mode()
+    finally:
+        await workai.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""passage_ranker module."""
+import math
+import re
+from collections import Counter
+from typing import List
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "to", "was", "were", "what", "when", "which", "who",
+    "will", "with"
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token for English text)"""
+    return math.ceil(len(text) / 4)
+
+
+def tokenize(text: str) -> List[str]:
+    return [term for term in re.findall(r"\w+", text.lower()) if term not in STOPWORDS]
+
+
+def split_passages(content: str, max_chars: int = 600) -> List[str]:
+    """Split page text into passages; short lines merge, long ones split at sentences"""
+    passages: List[str] = []
+    current = ""
+    for line in (line.strip() for line in content.splitlines()):
+        if not line:
+            continue
+        pieces = re.split(r"(?<=[.!?])\s+", line) if len(line) > max_chars else [line]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+def bm25_scores(passages: List[str], query: str, k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of each passage against the query terms"""
+    query_terms = set(tokenize(query))
+    docs = [Counter(tokenize(passage)) for passage in passages]
+    if not docs or not query_terms:
+        return [0.0] * len(passages)
+    avg_len = sum(sum(doc.values()) for doc in docs) / len(docs) or 1
+    scores = []
+    for doc in docs:
+        length = sum(doc.values())
+        score = 0.0
+        for term in query_terms:
+            freq = doc.get(term, 0)
+            if not freq:
+                continue
+            df = sum(1 for other in docs if term in other)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * freq * (k1 + 1) / (freq + k1 * (1 - b + b * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+def select_passages(content: str, query: str, token_budget: int = 750) -> str:
+    """Best BM25 passages for the query, packed into token_budget and kept in page order"""
+    if estimate_tokens(content) <= token_budget:
+        return content
+    passages = split_passages(content)
+    scores = bm25_scores(passages, query)
+    ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+    chosen, used = [], 0
+    for i in ranked:
+        cost = estimate_tokens(passages[i]) + 1
+        if used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+    if not chosen:
+        return content[:token_budget * 4]
+    return "\n\n".join(passages[i] for i in sorted(chosen))
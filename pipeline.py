@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""pipeline module."""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from dedup import NearDuplicateIndex
+from instrumentation import tracer
+from knowledge_index import format_age
+from research_agent import FAILED_TERM_MARKERS, NO_ANSWER_MARKERS, PLAN_LAYERS
+
+load_dotenv()
+
+# Layers dropped once confidence is reached, and layers whose unanswered terms are retried
+# when it stays low
+TRIMMABLE_LAYERS = ('secondary', 'recent')
+EXPANDABLE_LAYERS = ('primary', 'secondary')
+
+
+class TermJob:
+    """Research state for one search term as it moves through the pipeline stages"""
+
+    def __init__(self, search_type: str, search_term: str, skip: int = 0):
+        self.search_type = search_type
+        self.search_term = search_term
+        self.skip = skip  # ranked search results already tried by an earlier job for this term
+        self.trimmed = False
+        self.reused = False  # settled from the knowledge index instead of researched
+        self.candidates: List[Dict] = []
+        self.launched = 0
+        self.in_flight = 0
+        self.result: Optional[Dict] = None
+        self.done = asyncio.Event()
+        self.timers: List[asyncio.TimerHandle] = []
+        self.fetches: Set[asyncio.Future] = set()  # page fetches still running for this term
+        self.extracting = False  # a page of this term is queued for or with the LLM
+        self.waiting: List[Tuple[TermJob, Dict, str]] = []  # fetched pages held back meanwhile
+
+    @property
+    def finished(self) -> bool:
+        return self.result is not None
+
+    @property
+    def answered(self) -> bool:
+        return self.result is not None and not self.result['answer'].startswith(FAILED_TERM_MARKERS)
+
+    def finding(self, answer: str, source: Optional[str] = None) -> Dict:
+        result = {"search_term": self.search_term, "answer": answer}
+        if source:
+            result["source"] = source
+        result["search_type"] = self.search_type
+        return result
+
+
+class ResearchPipeline:
+    """plan → search → fetch → extract → verify → synthesize, one query at a time.
+
+    Stages are connected by bounded queues and each has its own worker count, so a term
+    moves on as soon as its input is ready. When the LLM falls behind, the full extract
+    queue blocks fetch workers, which in turn stop taking new URLs from the search stage.
+    Sources for a term are hedged: HEDGE_FANOUT candidates start together, another starts
+    on failure or every HEDGE_DELAY seconds, and the term is settled by its first
+    acceptable answer or by TERM_DEADLINE. Fetches still running for a settled term are
+    cancelled, so they give their browser page back straight away.
+
+    With ADAPTIVE_DEPTH, confidence is recomputed as terms settle. Once the primary layer
+    is done and confidence reaches CONFIDENCE_THRESHOLD, the secondary and recent terms
+    still open are dropped. If confidence is still below it when the plan is exhausted,
+    unanswered terms are retried once with their next-ranked sources and the query itself
+    is searched. QUERY_TIME_BUDGET and QUERY_TOKEN_BUDGET stop research in any mode and
+    move on to synthesis with what has been found.
+    """
+
+    def __init__(self, workai):
+        self.workai = workai
+        self.browser = workai.browser
+        self.researcher = workai.researcher
+        self.knowledge = workai.knowledge
+        queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+        self.search_workers = int(os.getenv("PIPELINE_SEARCH_WORKERS", "2"))
+        self.fetch_workers = int(os.getenv("PIPELINE_FETCH_WORKERS", str(self.browser.max_pages)))
+        self.extract_workers = int(os.getenv("PIPELINE_EXTRACT_WORKERS",
+                                             str(self.researcher.max_concurrency)))
+        self.search_queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.fetch_queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.extract_queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.layers: Dict[str, List[TermJob]] = {}
+        # LLM calls in flight → their terms
+        self.extractions: Dict[asyncio.Future, List[TermJob]] = {}
+        self.planned_layers: Set[str] = set()  # layers whose terms have all been queued or settled
+        self.plan_done = asyncio.Event()
+        self._background = set()
+        self.adaptive = workai.adaptive_depth
+        self.confidence = 0.0
+        self.trimmed = False  # remaining layers dropped because confidence was reached
+        self.stopped = False  # query time or token budget used up
+        self.deadline = None
+        # Per-run near-duplicate index, backed by the shared persistent one when enabled
+        self.dedup = NearDuplicateIndex(
+            max_distance=int(os.getenv("DEDUP_MAX_DISTANCE", "6")), store=workai.dedup_store
+        ) if workai.near_duplicates else None
+
+    # --- plan -------------------------------------------------------------
+
+    async def plan_stage(self, user_query: str):
+        feeder = None
+        try:
+            async for search_type, terms in self.researcher.stream_plan(user_query):
+                if self.stopped or (self.trimmed and search_type in TRIMMABLE_LAYERS):
+                    print(f"\n⏭️ Skipping layer: {search_type.upper()} ({len(terms)} terms)")
+                    continue
+                print(f"\n🔍 Layer: {search_type.upper()} ({len(terms)} terms)")
+                jobs = self.layers.setdefault(search_type, [])
+                searches = []
+                for term in terms:
+                    job = TermJob(search_type, term)
+                    jobs.append(job)
+                    if not self.reuse_finding(job):
+                        searches.append(job)
+                # The plan stream holds an LLM slot until it ends, so it must never wait on the
+                # bounded search queue: extract workers downstream may be waiting for that slot
+                feeder = self.spawn(self.queue_searches(searches, feeder))
+                # Terms reused above finish before the rest of their layer is queued
+                self.planned_layers.add(search_type)
+                self.check_confidence()
+        finally:
+            self.plan_done.set()
+
+    async def queue_searches(self, jobs: List[TermJob], previous: Optional[asyncio.Future]):
+        """Put one layer's jobs on the search queue once the layers planned before it are queued"""
+        if previous is not None:
+            await previous
+        for job in jobs:
+            await self.search_queue.put(job)
+
+    def reuse_finding(self, job: TermJob) -> bool:
+        """Settle job from a fresh matching finding in the knowledge index.
+
+        Only stale or missing terms are researched.
+        """
+        if self.knowledge is None:
+            return False
+        known = self.knowledge.reusable_finding(job.search_type, job.search_term)
+        if known is None:
+            return False
+        job.reused = True
+        age = format_age(time.time() - known['created_at'])
+        print(f"   📚 [{job.search_type.upper()}] Reusing finding from {age} ago: {job.search_term}")
+        self.finish(job, job.finding(known['text'], known['source'] or None))
+        return True
+
+    # --- search -----------------------------------------------------------
+
+    async def search_worker(self):
+        while True:
+            job = await self.search_queue.get()
+            try:
+                if job.finished:
+                    continue
+                print(f"   🔎 [{job.search_type.upper()}] Researching: {job.search_term}")
+                results = await self.browser.duckduckgo_search(job.search_term)
+                ranked = self.browser.rank_search_results(results)
+                job.candidates = ranked[job.skip:job.skip + self.workai.max_sources]
+                if not job.candidates:
+                    self.finish(job, job.finding(
+                        "Could not find reliable answer" if ranked else "No search results found"
+                    ))
+                    continue
+                loop = asyncio.get_running_loop()
+                job.timers.append(loop.call_later(self.workai.term_deadline, self.expire, job))
+                for _ in range(self.workai.hedge_fanout):
+                    item = self.next_candidate(job)
+                    if item:
+                        await self.fetch_queue.put(item)  # blocks while fetchers are saturated
+            except Exception as e:
+                print(f"   ⚠️ Search stage failed for {job.search_term}: {e}")
+                self.finish(job, job.finding("No search results found"))
+            finally:
+                self.search_queue.task_done()
+
+    # --- fetch ------------------------------------------------------------
+
+    def next_candidate(self, job: TermJob):
+        """Claim the next untried (job, candidate) fetch item, or None when none are left"""
+        if job.finished or job.launched >= len(job.candidates):
+            return None
+        candidate = job.candidates[job.launched]
+        job.launched += 1
+        job.in_flight += 1
+        if job.launched < len(job.candidates):
+            loop = asyncio.get_running_loop()
+            job.timers.append(
+                loop.call_later(self.workai.hedge_delay, self.hedge, job, job.launched)
+            )
+        return job, candidate
+
+    def launch_next(self, job: TermJob) -> bool:
+        """Queue the next untried candidate for job; False when none are left"""
+        item = self.next_candidate(job)
+        if item is None:
+            return False
+        # Timers and downstream workers must not block on the fetch queue; a helper task
+        # waits for room
+        self.spawn(self.fetch_queue.put(item))
+        return True
+
+    def hedge(self, job: TermJob, launched: int):
+        # Nothing new was launched since this timer was set: the sources in flight are slow
+        if not job.finished and job.launched == launched:
+            self.launch_next(job)
+
+    def candidate_failed(self, job: TermJob):
+        job.in_flight -= 1
+        if job.finished:
+            return
+        if not self.launch_next(job) and job.in_flight <= 0:
+            self.finish(job, job.finding("Could not find reliable answer"))
+
+    def expire(self, job: TermJob):
+        if not job.finished:
+            print(f"   ⏱️ Deadline reached for: {job.search_term}")
+            self.finish(job, job.finding("Could not find reliable answer"))
+
+    async def fetch_worker(self):
+        while True:
+            job, candidate = await self.fetch_queue.get()
+            try:
+                if job.finished:
+                    continue
+                started = time.perf_counter()
+                fetch = asyncio.ensure_future(self.browser.extract_page_content(candidate['url']))
+                job.fetches.add(fetch)
+                try:
+                    await asyncio.wait({fetch})
+                finally:
+                    job.fetches.discard(fetch)
+                    # No-op once done; stops the page load when this worker is cancelled
+                    fetch.cancel()
+                if fetch.cancelled():  # the term was settled by another source or its deadline
+                    self.candidate_failed(job)
+                    continue
+                content = fetch.result()
+                self.record_fetch(candidate['url'], time.perf_counter() - started, bool(content))
+                if not content or job.finished:
+                    self.candidate_failed(job)
+                    continue
+                candidate, reused = self.deduplicate(job, candidate, content)
+                if reused is not None:
+                    self.accept(job, candidate, reused)
+                else:
+                    await self.queue_extraction(job, candidate, content)
+            except Exception as e:
+                print(f"   ⚠️ Skipping {candidate['url']}: {e}")
+                self.candidate_failed(job)
+            finally:
+                self.fetch_queue.task_done()
+
+    def record_fetch(self, url: str, seconds: float, ok: bool):
+        # Cache hits say nothing about how the site performs
+        if self.browser.fetch_paths.get(url) != "cache":
+            self.browser.source_ranker.record_fetch(url, seconds, ok)
+
+    def deduplicate(self, job: TermJob, candidate: Dict,
+                    content: str) -> Tuple[Dict, Optional[str]]:
+        """Tag candidate with its page fingerprint and, for a near-duplicate page, the URL
+        first seen with that text.
+
+        Also returns the answer already extracted from that text for this term, if any.
+        """
+        if self.dedup is None:
+            return candidate, None
+        fingerprint = self.dedup.fingerprint(content)
+        if fingerprint is None:
+            return candidate, None
+        match = self.dedup.lookup(fingerprint)
+        if match is None:
+            self.dedup.add(fingerprint, candidate['url'])
+            return dict(candidate, fingerprint=fingerprint), None
+        match_fingerprint, document = match
+        answer = self.dedup.answer(match_fingerprint, job.search_term, job.search_type)
+        if document['url'] != candidate['url']:
+            reuse = ", reusing its extraction" if answer is not None else ""
+            print(f"   ♻️ {candidate['url']} is a near-duplicate of {document['url']}{reuse}")
+        return dict(candidate, fingerprint=match_fingerprint, canonical=document['url']), answer
+
+    # --- extract ----------------------------------------------------------
+
+    async def queue_extraction(self, job: TermJob, candidate: Dict, content: str):
+        """Send a fetched page to the LLM, unless another page of the same term is already there.
+
+        Hedging races the fetches; extraction is one page at a time per term, and a held-back
+        page is only extracted if the one before it gave no answer.
+        """
+        if job.extracting:
+            job.waiting.append((job, candidate, content))
+            return
+        job.extracting = True
+        await self.extract_queue.put((job, candidate, content))
+
+    def extraction_done(self, job: TermJob):
+        job.extracting = False
+        if job.waiting and not job.finished:
+            job.extracting = True
+            self.spawn(self.extract_queue.put(job.waiting.pop(0)))
+
+    async def extract_worker(self):
+        while True:
+            items = [await self.extract_queue.get()]
+            live = []
+            accepted = 0
+            if self.workai.batch_extraction:
+                # Whatever else is already waiting goes into the same request
+                while (len(items) < self.researcher.batch_max_items
+                       and not self.extract_queue.empty()):
+                    items.append(self.extract_queue.get_nowait())
+            try:
+                self.check_token_budget()
+                live = [item for item in items if not item[0].finished]
+                for job, _, _ in items:
+                    if job.finished:
+                        job.in_flight -= 1
+                if not live:
+                    continue
+                answers = await self.extract(live)
+                if answers is None:  # every term in the request was settled while it waited
+                    for job, _, _ in live:
+                        self.candidate_failed(job)
+                    continue
+                for (job, candidate, _), answer in zip(live, answers):
+                    extracted = answer != "Could not extract answer"
+                    if extracted:
+                        self.browser.source_ranker.record_extraction(
+                            candidate['url'],
+                            not any(marker in answer for marker in NO_ANSWER_MARKERS)
+                        )
+                    if self.dedup and candidate.get('fingerprint') is not None and extracted:
+                        self.dedup.record_answer(candidate['fingerprint'], job.search_term,
+                                                 job.search_type, answer)
+                    accepted += 1  # accept() settles the item's in-flight count, even if it raises
+                    self.accept(job, candidate, answer)
+            except Exception as e:
+                print(f"   ⚠️ Extract stage failed: {e}")
+                for job, _, _ in live[accepted:]:
+                    self.candidate_failed(job)
+            finally:
+                for job, _, _ in items:
+                    self.extraction_done(job)
+                    self.extract_queue.task_done()
+
+    async def extract(self, live: List[Tuple[TermJob, Dict, str]]) -> Optional[List[str]]:
+        """Answers for the live items, or None when finish() cancelled the LLM call"""
+        if len(live) > 1:
+            coroutine = self.researcher.extract_answers_batch([
+                {"search_term": job.search_term, "search_type": job.search_type, "content": content}
+                for job, _, content in live
+            ])
+        else:
+            job, _, content = live[0]
+            coroutine = self.researcher.extract_answer_from_content(
+                content, job.search_term, job.search_type
+            )
+        call = asyncio.ensure_future(coroutine)
+        self.extractions[call] = [job for job, _, _ in live]
+        try:
+            await asyncio.wait({call})
+        finally:
+            del self.extractions[call]
+            call.cancel()  # no-op once done; frees the LLM slot when this worker is cancelled
+        if call.cancelled():
+            return None
+        result = call.result()
+        return result if len(live) > 1 else [result]
+
+    def accept(self, job: TermJob, candidate: Dict, answer: str):
+        if job.finished or any(marker in answer for marker in NO_ANSWER_MARKERS):
+            self.candidate_failed(job)
+            return
+        job.in_flight -= 1
+        # Mirrors are credited to the first URL seen with the same text, so synthesis lists it once
+        self.finish(job, job.finding(answer, candidate.get('canonical', candidate['url'])))
+
+    def finish(self, job: TermJob, result: Dict):
+        if job.finished:
+            return
+        job.result = result
+        for timer in job.timers:
+            timer.cancel()
+        for fetch in job.fetches:
+            fetch.cancel()
+        job.waiting.clear()
+        # An LLM call still queued or running for this term is dropped unless it also serves
+        # open terms
+        for call, jobs in self.extractions.items():
+            if job in jobs and all(other.finished for other in jobs):
+                call.cancel()
+        job.done.set()
+        self.check_confidence()
+
+    # --- adaptive depth and budgets ----------------------------------------
+
+    def trim(self, should_trim) -> int:
+        """Settle every open job matching should_trim without researching it; returns how many"""
+        jobs = [job for layer_jobs in self.layers.values() for job in layer_jobs
+                if not job.finished and should_trim(job)]
+        for job in jobs:
+            job.trimmed = True
+            self.finish(job, job.finding("Skipped"))
+        return len(jobs)
+
+    def check_confidence(self):
+        if not self.adaptive or self.trimmed or self.stopped:
+            return
+        primary = self.layers.get('primary')
+        if ('primary' not in self.planned_layers or not primary
+                or not all(job.finished for job in primary)):
+            return
+        self.confidence = self.researcher.research_confidence(self.collect_results())
+        if self.confidence >= self.workai.confidence_threshold:
+            self.trimmed = True
+            skipped = self.trim(lambda job: job.search_type in TRIMMABLE_LAYERS)
+            print(f"🎯 Confidence {self.confidence:.0f}% reached the "
+                  f"{self.workai.confidence_threshold:.0f}% threshold"
+                  + (f", skipping {skipped} remaining terms" if skipped else ""))
+
+    def stop(self, reason: str):
+        if self.stopped:
+            return
+        self.stopped = True
+        skipped = self.trim(lambda job: True)
+        print(f"⏱️ Query {reason} used up, synthesizing now ({skipped} terms left unresearched)")
+
+    def check_token_budget(self):
+        trace = tracer.current()
+        budget = self.workai.query_token_budget
+        if budget and trace and trace.tokens() >= budget:
+            self.stop("token budget")
+
+    async def expand(self, user_query: str) -> bool:
+        """Queue one more round of searches while confidence stays below the threshold"""
+        if self.stopped or self.trimmed:
+            return False
+        self.confidence = self.researcher.research_confidence(self.collect_results())
+        loop = asyncio.get_running_loop()
+        if self.confidence >= self.workai.confidence_threshold or (
+                self.deadline is not None
+                and self.deadline - loop.time() < self.workai.term_deadline):
+            return False
+        jobs = []
+        for search_type in EXPANDABLE_LAYERS:
+            layer_jobs = self.layers.get(search_type, [])
+            for i, job in enumerate(layer_jobs):
+                if not job.trimmed and not job.answered:
+                    # The retry replaces the failed job, so a second failure does not count twice
+                    layer_jobs[i] = TermJob(search_type, job.search_term,
+                                            skip=job.skip + self.workai.max_sources)
+                    jobs.append(layer_jobs[i])
+        primary = self.layers.setdefault('primary', [])
+        if all(job.search_term.lower() != user_query.lower() for job in primary):
+            primary.append(TermJob('primary', user_query))
+            jobs.append(primary[-1])
+        if not jobs:
+            return False
+        print(f"\n🔁 Confidence {self.confidence:.0f}% is below "
+              f"{self.workai.confidence_threshold:.0f}%: "
+              f"{len(jobs)} more searches with further sources")
+        for job in jobs:
+            await self.search_queue.put(job)
+        return True
+
+    # --- verify / synthesize ---------------------------------------------
+
+    async def wait_for_layer(self, search_type: Optional[str] = None):
+        """Wait until the plan is complete and every job (of one layer, if given) has a result"""
+        await self.plan_done.wait()
+        jobs = [job for layer, layer_jobs in self.layers.items() if search_type in (None, layer)
+                for job in layer_jobs]
+        await asyncio.gather(*(job.done.wait() for job in jobs))
+
+    async def verify_stage(self) -> str:
+        # Only needs the verification layer, so it overlaps with the rest of the research
+        await self.wait_for_layer('verification')
+        print("\n4️⃣ Analyzing contradictions and verifying facts...")
+        verification_results = [job.result for job in self.layers.get('verification', [])
+                                if not job.trimmed]
+        return await self.researcher.analyze_contradictions(verification_results)
+
+    def collect_results(self) -> Dict[str, List[Dict]]:
+        """Results so far per layer; open and skipped terms are left out"""
+        results = {
+            search_type: [job.result for job in self.layers.get(search_type, [])
+                          if job.result is not None and not job.trimmed]
+            for search_type in PLAN_LAYERS
+        }
+        return {search_type: layer_results for search_type, layer_results in results.items()
+                if layer_results}
+
+    def new_results(self) -> Dict[str, List[Dict]]:
+        """Answered findings researched in this run, for the knowledge index"""
+        return {
+            search_type: [job.result for job in layer_jobs
+                          if job.result is not None and job.answered
+                          and not job.trimmed and not job.reused]
+            for search_type, layer_jobs in self.layers.items()
+        }
+
+    def spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def run(self, user_query: str, stream: bool = False) -> str:
+        workers = (
+            [self.spawn(self.search_worker()) for _ in range(self.search_workers)]
+            + [self.spawn(self.fetch_worker()) for _ in range(self.fetch_workers)]
+            + [self.spawn(self.extract_worker()) for _ in range(self.extract_workers)]
+        )
+        loop = asyncio.get_running_loop()
+        budget_timer = None
+        if self.workai.query_time_budget:
+            self.deadline = loop.time() + self.workai.query_time_budget
+            budget_timer = loop.call_later(self.workai.query_time_budget, self.stop, "time budget")
+        try:
+            print("2️⃣ Creating deep research plan...")
+            planner = self.spawn(self.plan_stage(user_query))
+            verifier = self.spawn(self.verify_stage())
+            print("3️⃣ Conducting multi-layer research...")
+            await planner
+            await self.wait_for_layer()
+            if self.adaptive and await self.expand(user_query):
+                await self.wait_for_layer()
+            contradiction_analysis = await verifier
+            if self.adaptive:
+                self.confidence = self.researcher.research_confidence(self.collect_results())
+                print(f"📊 Research confidence {self.confidence:.0f}% after "
+                      f"{sum(len(results) for results in self.collect_results().values())} terms")
+
+            if self.dedup and self.dedup.duplicates:
+                print(f"♻️ {self.dedup.duplicates} near-duplicate pages, "
+                      f"{self.dedup.reused_answers} extractions reused")
+            print("5️⃣ Synthesizing comprehensive answer...")
+            if stream:
+                print("=" * 60)
+            return await self.researcher.synthesize_comprehensive_answer(
+                user_query, self.collect_results(), contradiction_analysis, stream=stream
+            )
+        finally:
+            if budget_timer:
+                budget_timer.cancel()
+            for task in list(self._background):
+                task.cancel()
+            for layer_jobs in self.layers.values():
+                for job in layer_jobs:
+                    for timer in job.timers:
+                        timer.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""rate_limiter module."""
+import asyncio
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value) -> Optional[float]:
+    """Seconds from a rate-limit header value: '7.66s', '2m59.56s', '120ms' or a bare number"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+def parse_retry_after(headers: Optional[Mapping]) -> Optional[float]:
+    """Seconds to wait according to retry-after-ms / retry-after (delta seconds or HTTP date)"""
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class TokenBucket:
+    """Budget refilled continuously at per_minute units a minute, capped at one minute's worth.
+
+    A per_minute of 0 or less means unlimited. The level may go negative when a request
+    turns out to cost more than estimated; later callers then wait for the refill.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken; requests bigger than the bucket wait for a full one"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) * 60 / self.per_minute
+
+    def take(self, amount: float, now: float):
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + amount)
+
+    def observe(self, remaining: Optional[float], now: float):
+        """Trust the server when it reports less headroom than the local estimate"""
+        if self.unlimited or remaining is None:
+            return
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+class Permit:
+    """One admitted request; reports its real cost and outcome back to the limiter"""
+
+    def __init__(self, limiter: "RateLimiter", estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+
+    def succeeded(self, tokens: Optional[int] = None, headers: Optional[Mapping] = None):
+        if tokens is not None:
+            difference = tokens - self.estimated_tokens
+            if difference > 0:
+                self.limiter.tokens.take(difference, time.monotonic())
+            else:
+                self.limiter.tokens.give_back(-difference)
+        self.limiter.record_success(headers)
+
+
+class RateLimiter:
+    """Shared admission control for one API quota.
+
+    A request is admitted when a concurrency slot is free and both the request and token
+    buckets can cover it (tokens are estimated before the call and corrected afterwards).
+    Rate-limit headers only ever lower the local budget. The concurrency limit follows
+    AIMD: it halves on a 429 and grows by one after a full window of successes, so the
+    in-flight count settles just under what the quota sustains instead of bursting into
+    429 storms. retry_delay() turns a failure into a jittered backoff, or None to give up.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 4, max_retries: int = 4, base_delay: float = 1.0,
+                 max_delay: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self.retries = 0
+        self.waited = 0.0
+        self._successes = 0
+        self._hold_until = 0.0
+        self._changed = asyncio.Condition()
+
+    async def _acquire(self, estimated_tokens: int):
+        started = time.monotonic()
+        async with self._changed:
+            while True:
+                now = time.monotonic()
+                timeout = None
+                if self.in_flight < self.limit:
+                    timeout = max(self.paused_until - now, self.requests.delay(1, now),
+                                  self.tokens.delay(estimated_tokens, now))
+                    if timeout <= 0:
+                        self.requests.take(1, now)
+                        self.tokens.take(estimated_tokens, now)
+                        self.in_flight += 1
+                        self.waited += now - started
+                        return
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self):
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int):
+        """Wait for budget, hold a concurrency slot for the block and yield its Permit"""
+        await self._acquire(estimated_tokens)
+        try:
+            yield Permit(self, estimated_tokens)
+        finally:
+            await self._release()
+
+    def observe(self, headers: Optional[Mapping]):
+        """Sync the buckets with x-ratelimit-remaining-*; pause until x-ratelimit-reset-* at zero"""
+        if not headers:
+            return
+        now = time.monotonic()
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            try:
+                remaining = float(headers[f"x-ratelimit-remaining-{kind}"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            bucket.observe(remaining, now)
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining <= 0 and reset:
+                self.paused_until = max(self.paused_until, now + reset)
+
+    def record_success(self, headers: Optional[Mapping] = None):
+        self.observe(headers)
+        self._successes += 1
+        if self.limit < self.max_concurrency and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+
+    def record_rate_limited(self, headers: Optional[Mapping] = None) -> Optional[float]:
+        """Back off after a 429; returns the server's retry-after, if it sent one"""
+        now = time.monotonic()
+        retry_after = parse_retry_after(headers)
+        self.rate_limited += 1
+        self._successes = 0
+        # 429s from requests that were already in flight belong to the same overload: halve once
+        if now >= self._hold_until:
+            self.limit = max(1, self.limit // 2)
+            self._hold_until = now + max(retry_after or 0.0, self.base_delay)
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        self.observe(headers)
+        return retry_after
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with equal jitter: between half and all of base * 2^attempt"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(ceiling / 2, ceiling)
+
+    def retry_delay(self, attempt: int, status: Optional[int] = None,
+                    headers: Optional[Mapping] = None, transient: bool = False) -> Optional[float]:
+        """Seconds to wait before retrying a failed request, or None when it should not be retried.
+
+        429s and 5xx responses are retried, as are transient errors without a status (timeouts,
+        dropped connections); any other failure is returned to the caller straight away.
+        """
+        if status == 429:
+            retry_after = self.record_rate_limited(headers)
+        elif (status is not None and status >= 500) or (status is None and transient):
+            retry_after = None
+        else:
+            return None
+        if attempt >= self.max_retries:
+            return None
+        self.retries += 1
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay / 2)
+        return self.backoff(attempt)
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "max_concurrency": self.max_concurrency,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "waited": round(self.waited, 2)
+        }
@@ -1,24 +1,118 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 """research_agent module."""
+import asyncio
+import hashlib
+import json
 import os
-from typing import List, Dict
-from groq import Groq
+import re
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from groq import APIConnectionError, AsyncGroq, Groq
 from dotenv import load_dotenv
+from passage_ranker import estimate_tokens, select_passages
+from cache import PersistentCache
+from instrumentation import tracer
+from rate_limiter import RateLimiter
 
 load_dotenv()
 
-class WorkAIResearcher:
+# Research layers in the order the plan lists them
+PLAN_LAYERS = ('primary', 'secondary', 'verification', 'recent')
+
+# Answers that mean a source did not help
+NO_ANSWER_MARKERS = ("No clear answer found", "Could not extract answer")
+
+# Findings for search terms that ended without an answer
+FAILED_TERM_MARKERS = NO_ANSWER_MARKERS + (
+    "Could not find reliable answer", "No search results found"
+)
+
+# Marker in _synthesis_header; an answer containing it is a successful deep research answer
+SUCCESS_MARKER = "DEEP RESEARCH COMPLETE"
+
+# "### ITEM 2", "**ITEM 2**" or "ITEM 2:" section headers of a batched answer; the answer may
+# follow on the header line
+BATCH_HEADER = re.compile(
+    r"^[ \t]*(?P<hashes>#{1,4})?[ \t]*(?P<bold>\*\*)?[ \t]*ITEM[ \t]+(?P<number>\d+)[ \t]*\**[ \t]*"
+    r"(?P<colon>:)?[ \t]*\**[ \t]*(?P<rest>.*)$",
+    re.M | re.I
+)
+
+class ResearcherBase(ABC):
+    """Prompts, response parsing, response cache and confidence scoring shared by the researchers.
+
+    Subclasses provide the client (_create_client) and the LLM round trips built on it.
+    """
+
     def __init__(self):
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY not found in .env file")
-        self.client = Groq(api_key=api_key)
+        self.client = self._create_client(api_key)
         self.model = "llama-3.3-70b-versatile"  # Free Llama model on Groq
+        self.passage_budget = int(os.getenv("PASSAGE_TOKEN_BUDGET", "750"))
+        self.batch_token_budget = int(os.getenv("BATCH_TOKEN_BUDGET", "6000"))
+        self.batch_max_items = int(os.getenv("BATCH_MAX_ITEMS", "8"))
+        self.response_cache = None
+        if os.getenv("LLM_CACHE", "True") == "True":
+            self.response_cache = PersistentCache(
+                "llm",
+                ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 86400))),
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024
+            )
+        # Completions above this temperature are not deterministic enough to replay
+        self.cache_max_temperature = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+        self.tokens_saved = 0
 
-    def break_down_query(self, user_query: str) -> Dict[str, List[str]]:
-        """Break query into multiple research layers for deep search"""
-        prompt = f'''
+    @abstractmethod
+    def _create_client(self, api_key: str):
+        """The Groq client the LLM round trips of the subclass use"""
+
+    def _cache_key(self, messages: List[Dict], temperature: float, max_tokens: int):
+        """Content address of a request, or None when the response must not be cached"""
+        if not self.response_cache or temperature > self.cache_max_temperature:
+            return None
+        request = {"model": self.model, "messages": messages, "temperature": temperature,
+                   "max_tokens": max_tokens}
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _cached_response(self, cache_key):
+        if cache_key is None:
+            return None
+        cached = self.response_cache.get_json(cache_key)
+        if cached is None:
+            return None
+        self.tokens_saved += cached["tokens"]
+        return cached["content"]
+
+    def _store_response(self, cache_key, response) -> str:
+        content = response.choices[0].message.content.strip()
+        tokens = response.usage.total_tokens if getattr(response, "usage", None) else 0
+        return self._store_content(cache_key, content, tokens)
+
+    def _record_usage(self, span: Dict, response):
+        usage = getattr(response, "usage", None)
+        if usage:
+            span["prompt_tokens"] = usage.prompt_tokens
+            span["completion_tokens"] = usage.completion_tokens
+
+    def _store_content(self, cache_key, content: str, tokens: int) -> str:
+        if cache_key is not None:
+            self.response_cache.set_json(cache_key, {"content": content, "tokens": tokens})
+        return content
+
+    def cache_report(self) -> Dict:
+        """Response cache hit ratio and the prompt + completion tokens it avoided"""
+        if not self.response_cache:
+            return {"enabled": False}
+        stats = self.response_cache.stats()
+        return dict(stats, enabled=True, tokens_saved=self.tokens_saved)
+
+    def _plan_prompt(self, user_query: str) -> str:
+        return f'''
 Analyze this user query and create a comprehensive research plan:
 User Query: "{user_query}"
 
@@ -34,49 +128,41 @@ def break_down_query(self, user_query: str) -> Dict[str, List[str]]:
 VERIFICATION: term1, term2
 RECENT: term1 2024, term2 latest
 '''
-        try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model,
-                temperature=0.3,
-                max_tokens=300
-            )
-            
-            lines = response.choices[0].message.content.strip().split('\n')
-            
-            search_plan = {
-                'primary': [],
-                'secondary': [],
-                'verification': [],
-                'recent': []
-            }
-            
-            for line in lines:
-                if line.startswith('PRIMARY:'):
-                    search_plan['primary'] = [term.strip() for term in line.replace('PRIMARY:', '').split(',')]
-                elif line.startswith('SECONDARY:'):
-                    search_plan['secondary'] = [term.strip() for term in line.replace('SECONDARY:', '').split(',')]
-                elif line.startswith('VERIFICATION:'):
-                    search_plan['verification'] = [term.strip() for term in line.replace('VERIFICATION:', '').split(',')]
-                elif line.startswith('RECENT:'):
-                    search_plan['recent'] = [term.strip() for term in line.replace('RECENT:', '').split(',')]
-            
-            print(f"✅ Generated deep search plan:")
-            print(f"   📍 Primary: {search_plan['primary']}")
-            print(f"   🔍 Secondary: {search_plan['secondary']}")
-            print(f"   ✓ Verification: {search_plan['verification']}")
-            print(f"   🕐 Recent: {search_plan['recent']}")
-            return search_plan
-        except Exception as e:
-            print(f"❌ Failed to break down query: {e}")
-            return {'primary': [user_query], 'secondary': [], 'verification': [], 'recent': []}
 
-    def extract_answer_from_content(self, content: str, search_term: str, search_type: str) -> str:
-        """Enhanced extraction based on search type"""
+    def _parse_plan_line(self, line: str) -> Optional[Tuple[str, List[str]]]:
+        """(search_type, terms) for one "PRIMARY: a, b" style plan line, or None"""
+        for search_type in PLAN_LAYERS:
+            label = f"{search_type.upper()}:"
+            if line.startswith(label):
+                return search_type, [term.strip() for term in line.replace(label, '').split(',')]
+        return None
+
+    def _print_plan(self, search_plan: Dict[str, List[str]]):
+        print(f"✅ Generated deep search plan:")
+        print(f"   📍 Primary: {search_plan['primary']}")
+        print(f"   🔍 Secondary: {search_plan['secondary']}")
+        print(f"   ✓ Verification: {search_plan['verification']}")
+        print(f"   🕐 Recent: {search_plan['recent']}")
+
+    def _parse_plan(self, text: str) -> Dict[str, List[str]]:
+        search_plan: Dict[str, List[str]] = {search_type: [] for search_type in PLAN_LAYERS}
+        for line in text.split('\n'):
+            parsed = self._parse_plan_line(line)
+            if parsed:
+                search_plan[parsed[0]] = parsed[1]
+        self._print_plan(search_plan)
+        return search_plan
+
+    def _fallback_plan(self, user_query: str) -> Dict[str, List[str]]:
+        return {'primary': [user_query], 'secondary': [], 'verification': [], 'recent': []}
+
+    def _extraction_prompt(self, content: str, search_term: str, search_type: str) -> str:
+        # Send the passages most relevant to the term rather than the first few thousand chars
+        content = select_passages(content, search_term, self.passage_budget)
         if search_type == 'verification':
-            prompt = f'''
+            return f'''
 Analyze this content to verify or contradict information about: "{search_term}"
-Content: {content[:3000]}
+Content: {content}
 
 Look for:
 - Facts that support or contradict the topic
@@ -88,10 +174,9 @@ def extract_answer_from_content(self, content: str, search_term: str, search_typ
 CONTRADICTS: [what contradicts it]
 NEUTRAL: [neutral/unclear information]
 '''
-        else:
-            prompt = f'''
+        return f'''
 From this content, extract comprehensive information about: "{search_term}"
-Content: {content[:3000]}
+Content: {content}
 
 Rules:
 - Extract specific facts, numbers, dates, names
@@ -102,27 +187,67 @@ def extract_answer_from_content(self, content: str, search_term: str, search_typ
 
 Answer:
 '''
-        
-        try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model,
-                temperature=0,
-                max_tokens=200
-            )
-            answer = response.choices[0].message.content.strip()
-            print(f"✅ Extracted {search_type} answer for '{search_term}': {answer[:100]}...")
-            return answer
-        except Exception as e:
-            print(f"❌ Failed to extract {search_type} answer: {e}")
-            return "Could not extract answer"
 
-    def analyze_contradictions(self, verification_results: List[Dict]) -> str:
-        """Analyze verification results for contradictions"""
-        if not verification_results:
-            return "No verification data available"
-            
-        prompt = f'''
+    def _pack_batches(self, items: List[Dict]) -> List[List[int]]:
+        """Group item indices into requests that fit the batch token budget"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        used = 0
+        for i, item in enumerate(items):
+            cost = min(estimate_tokens(item['content']), self.passage_budget) + 60
+            full = used + cost > self.batch_token_budget or len(current) >= self.batch_max_items
+            if current and full:
+                batches.append(current)
+                current, used = [], 0
+            current.append(i)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _batch_prompt(self, items: List[Dict]) -> str:
+        sections = []
+        for number, item in enumerate(items, 1):
+            if item['search_type'] == 'verification':
+                task = (f'Verify or contradict information about: "{item["search_term"]}". '
+                        "Answer as SUPPORTS: / CONTRADICTS: / NEUTRAL: lines.")
+            else:
+                task = ("Extract specific facts, numbers, dates and names about: "
+                        f'"{item["search_term"]}". Keep under 150 words. '
+                        'If no clear answer, say "No clear answer found".')
+            content = select_passages(item['content'], item['search_term'], self.passage_budget)
+            sections.append(f"### ITEM {number}\nTask: {task}\nContent: {content}")
+        return (
+            "Answer each item below independently, using only that item's content.\n\n"
+            + "\n\n".join(sections)
+            + "\n\nRespond with one section per item, in order, each starting with its header line "
+            "exactly as given (### ITEM 1, ### ITEM 2, ...) followed by the answer.\n"
+        )
+
+    def _parse_batch(self, text: str, count: int) -> Dict[int, str]:
+        """Map item index to answer; items missing from the response are left out.
+
+        Only marked headers for the requested item numbers, in increasing order, start a new
+        answer, so a bare "item 2" line inside an answer does not split it.
+        """
+        headers = []
+        last = 0
+        for match in BATCH_HEADER.finditer(text):
+            number = int(match.group("number"))
+            marked = match.group("hashes") or match.group("bold") or match.group("colon")
+            if marked and last < number <= count:
+                headers.append((number, match))
+                last = number
+        answers = {}
+        for position, (number, match) in enumerate(headers):
+            end = headers[position + 1][1].start() if position + 1 < len(headers) else len(text)
+            body = (match.group("rest") + text[match.end():end]).strip()
+            if body:
+                answers[number - 1] = body
+        return answers
+
+    def _contradiction_prompt(self, verification_results: List[Dict]) -> str:
+        return f'''
 Analyze these verification results for contradictions or conflicting information:
 
 {verification_results}
@@ -135,60 +260,53 @@ def analyze_contradictions(self, verification_results: List[Dict]) -> str:
 
 Keep it concise and factual.
 '''
-        
-        try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model,
-                temperature=0.2,
-                max_tokens=300
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"❌ Failed to analyze contradictions: {e}")
-            return "Could not analyze verification data"
 
-    def calculate_research_confidence(self, all_results: Dict) -> str:
-        """Enhanced confidence calculation for deep search."""
+    def research_confidence(self, all_results: Dict) -> float:
+        """Confidence (0-100) from the share of answered terms plus a verification depth bonus"""
         total_searches = sum(len(results) for results in all_results.values())
         if total_searches == 0:
-            return "Research Confidence: 0%"
+            return 0.0
 
         successful_extractions = 0
         verification_quality = 0
-        no_answer_markers = ("No clear answer found", "Could not extract answer")
 
         for search_type, results in all_results.items():
             for result in results:
                 answer = result.get("answer", "")
-                if answer and not answer.startswith(no_answer_markers):
+                if answer and not answer.startswith(FAILED_TERM_MARKERS):
                     successful_extractions += 1
                 if search_type == "verification" and len(answer) > 50:
                     verification_quality += 1
 
         base_confidence = (successful_extractions / total_searches) * 100
-        verification_bonus = (verification_quality / max(1, len(all_results.get("verification", [])))) * 15
-        final_confidence = min(100, base_confidence + verification_bonus)
-        
-        return f"Research Confidence: {final_confidence:.0f}% (Deep Search)"
+        verifications = max(1, len(all_results.get("verification", [])))
+        verification_bonus = (verification_quality / verifications) * 15
+        return min(100, base_confidence + verification_bonus)
 
-    def synthesize_comprehensive_answer(self, user_query: str, all_results: Dict, contradiction_analysis: str) -> str:
-        """Synthesize all research layers into comprehensive answer"""
-        
-        findings_by_type = {}
+    def calculate_research_confidence(self, all_results: Dict) -> str:
+        """Enhanced confidence calculation for deep search."""
+        if not any(all_results.values()):
+            return "Research Confidence: 0%"
+        return f"Research Confidence: {self.research_confidence(all_results):.0f}% (Deep Search)"
+
+    def _collect_findings(self, all_results: Dict):
+        findings_by_type: Dict[str, List[str]] = {}
         all_sources = set()
         
         for search_type, results in all_results.items():
             findings_by_type[search_type] = []
             for result in results:
-                findings_by_type[search_type].append(f"- {result['search_term']}: {result['answer']}")
+                findings_by_type[search_type].append(
+                    f"- {result['search_term']}: {result['answer']}"
+                )
                 if result.get('source'):
                     all_sources.add(result['source'])
         
-        sources_list = "\n".join([f"  {src}" for src in all_sources]) if all_sources else "  [No sources recorded]"
-        confidence_score = self.calculate_research_confidence(all_results)
-        
-        prompt = f'''
+        return findings_by_type, all_sources
+
+    def _synthesis_prompt(self, user_query: str, findings_by_type: Dict,
+                          contradiction_analysis: str) -> str:
+        return f'''
 You are WORKAI conducting DEEP RESEARCH. Synthesize this comprehensive analysis:
 
 Query: "{user_query}"
@@ -216,33 +334,382 @@ def synthesize_comprehensive_answer(self, user_query: str, all_results: Dict, co
 Make this MORE thorough and accurate than ChatGPT, Claude, or any standard AI tool.
 Show the depth of research conducted.
 '''
-        
-        try:
+
+    def _synthesis_header(self) -> str:
+        return (
+            "╔══════════════════════════════════════════════════════╗\n"
+            f"║         🤖 WORKAI {SUCCESS_MARKER}            ║\n"
+            "╚══════════════════════════════════════════════════════╝\n"
+        )
+
+    def _synthesis_footer(self, all_results: Dict, all_sources: set) -> str:
+        sources_list = ("\n".join([f"  {src}" for src in all_sources]) if all_sources
+                        else "  [No sources recorded]")
+        confidence_score = self.calculate_research_confidence(all_results)
+        return (
+            f"📊 {confidence_score}\n"
+            f"🔍 Sources Analyzed: {len(all_sources)}\n"
+            f"📋 Search Layers: {len([k for k, v in all_results.items() if v])}\n"
+            "─────────────────────────────────────────────────────\n"
+            "SOURCES CONSULTED:\n"
+            f"{sources_list}\n"
+        )
+
+    def _format_synthesis(self, final_answer: str, all_results: Dict, all_sources: set) -> str:
+        footer = self._synthesis_footer(all_results, all_sources)
+        return f"{self._synthesis_header()}{final_answer}\n\n{footer}"
+
+    def _synthesis_failure(self) -> str:
+        return (
+            "╔══════════════════════════════════════════════════════╗\n"
+            "║   ❌ Unable to generate deep research answer        ║\n"
+            "╚══════════════════════════════════════════════════════╝\n"
+        )
+
+
+class WorkAIResearcher(ResearcherBase):
+    """Blocking researcher: every LLM call is a synchronous Groq round trip"""
+
+    def _create_client(self, api_key: str):
+        return Groq(api_key=api_key)
+
+    def _chat(self, prompt: str, temperature: float, max_tokens: int,
+              label: str = "llm.chat") -> str:
+        """Single chat completion round trip; every LLM call goes through here"""
+        messages = [{"role": "user", "content": prompt}]
+        cache_key = self._cache_key(messages, temperature, max_tokens)
+        with tracer.span(label, temperature=temperature, max_tokens=max_tokens) as span:
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                span["outcome"] = "cached"
+                return cached
             response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
+                messages=messages,
                 model=self.model,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            self._record_usage(span, response)
+            return self._store_response(cache_key, response)
+
+    def break_down_query(self, user_query: str) -> Dict[str, List[str]]:
+        """Break query into multiple research layers for deep search"""
+        try:
+            return self._parse_plan(self._chat(self._plan_prompt(user_query), temperature=0.3,
+                                               max_tokens=300, label="llm.plan"))
+        except Exception as e:
+            print(f"❌ Failed to break down query: {e}")
+            return self._fallback_plan(user_query)
+
+    def extract_answer_from_content(self, content: str, search_term: str,
+                                    search_type: str) -> str:
+        """Enhanced extraction based on search type"""
+        try:
+            answer = self._chat(self._extraction_prompt(content, search_term, search_type),
+                                temperature=0, max_tokens=200, label="llm.extract")
+            print(f"✅ Extracted {search_type} answer for '{search_term}': {answer[:100]}...")
+            return answer
+        except Exception as e:
+            print(f"❌ Failed to extract {search_type} answer: {e}")
+            return "Could not extract answer"
+
+    def analyze_contradictions(self, verification_results: List[Dict]) -> str:
+        """Analyze verification results for contradictions"""
+        if not verification_results:
+            return "No verification data available"
+
+        try:
+            return self._chat(self._contradiction_prompt(verification_results), temperature=0.2,
+                              max_tokens=300, label="llm.contradictions")
+        except Exception as e:
+            print(f"❌ Failed to analyze contradictions: {e}")
+            return "Could not analyze verification data"
+
+    def synthesize_comprehensive_answer(self, user_query: str, all_results: Dict,
+                                        contradiction_analysis: str) -> str:
+        """Synthesize all research layers into comprehensive answer"""
+        findings_by_type, all_sources = self._collect_findings(all_results)
+        try:
+            final_answer = self._chat(
+                self._synthesis_prompt(user_query, findings_by_type, contradiction_analysis),
                 temperature=0.3,
-                max_tokens=800
+                max_tokens=800,
+                label="llm.synthesis"
             )
-            final_answer = response.choices[0].message.content.strip()
             print("✅ Generated comprehensive deep research answer")
-            
-            return (
-                "╔══════════════════════════════════════════════════════╗\n"
-                "║         🤖 WORKAI DEEP RESEARCH COMPLETE            ║\n"
-                "╚══════════════════════════════════════════════════════╝\n"
-                f"{final_answer}\n\n"
-                f"📊 {confidence_score}\n"
-                f"🔍 Sources Analyzed: {len(all_sources)}\n"
-                f"📋 Search Layers: {len([k for k, v in all_results.items() if v])}\n"
-                "─────────────────────────────────────────────────────\n"
-                "SOURCES CONSULTED:\n"
-                f"{sources_list}\n"
-            )
+            return self._format_synthesis(final_answer, all_results, all_sources)
         except Exception as e:
             print(f"❌ Failed to synthesize comprehensive answer: {e}")
-            return (
-                "╔══════════════════════════════════════════════════════╗\n"
-                "║   ❌ Unable to generate deep research answer        ║\n"
-                "╚══════════════════════════════════════════════════════╝\n"
+            return self._synthesis_failure()
+
+
+class AsyncWorkAIResearcher(ResearcherBase):
+    """Non-blocking researcher: LLM calls are awaited on AsyncGroq behind a shared rate limiter.
+
+    The limiter keeps requests and tokens per minute within LLM_REQUESTS_PER_MINUTE and
+    LLM_TOKENS_PER_MINUTE, adapts the in-flight limit (at most LLM_CONCURRENCY) to 429s,
+    and schedules retries, so rate-limited calls are delayed rather than lost.
+    """
+
+    def __init__(self, max_concurrency=None):
+        super().__init__()
+        self.max_concurrency = max(1, max_concurrency or int(os.getenv("LLM_CONCURRENCY", "4")))
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30")),
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "12000")),
+            max_concurrency=self.max_concurrency,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4"))
+        )
+
+    def _create_client(self, api_key: str):
+        # Retries are scheduled by the rate limiter, not inside the SDK
+        return AsyncGroq(api_key=api_key, max_retries=0)
+
+    def _retry_delay(self, error: Exception, attempt: int, span: Dict) -> Optional[float]:
+        status = getattr(error, "status_code", None)
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        delay = self.rate_limiter.retry_delay(
+            attempt, status, headers, transient=isinstance(error, APIConnectionError)
+        )
+        if delay is not None:
+            span["retries"] = attempt + 1
+            reason = status or type(error).__name__
+            print(f"⏳ Groq request failed ({reason}), retrying in {delay:.1f}s")
+        return delay
+
+    async def _create(self, **request):
+        """Send one completion request; returns (parsed response or stream, response headers)"""
+        completions = self.client.chat.completions
+        raw = await completions.with_raw_response.create(model=self.model, **request)
+        parsed = raw.parse()
+        if asyncio.iscoroutine(parsed):
+            parsed = await parsed
+        return parsed, raw.headers
+
+    async def _chat(self, prompt: str, temperature: float, max_tokens: int,
+                    label: str = "llm.chat") -> str:
+        messages = [{"role": "user", "content": prompt}]
+        cache_key = self._cache_key(messages, temperature, max_tokens)
+        with tracer.span(label, temperature=temperature, max_tokens=max_tokens) as span:
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                span["outcome"] = "cached"
+                return cached
+            estimate = estimate_tokens(prompt) + max_tokens
+            attempt = 0
+            while True:
+                queued_at = time.perf_counter()
+                async with self.rate_limiter.slot(estimate) as permit:
+                    span["queued"] = span.get("queued", 0.0) + time.perf_counter() - queued_at
+                    try:
+                        response, headers = await self._create(
+                            messages=messages, temperature=temperature, max_tokens=max_tokens
+                        )
+                    except Exception as e:
+                        delay = self._retry_delay(e, attempt, span)
+                        if delay is None:
+                            raise
+                    else:
+                        usage = getattr(response, "usage", None)
+                        permit.succeeded(usage.total_tokens if usage else None, headers)
+                        self._record_usage(span, response)
+                        return self._store_response(cache_key, response)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _chat_stream(self, prompt: str, temperature: float, max_tokens: int,
+                           label: str = "llm.chat") -> AsyncIterator[str]:
+        """Streaming variant of _chat yielding text deltas; cached responses arrive as one delta.
+
+        Only opening the stream is retried; a stream that fails after its first delta raises.
+        """
+        messages = [{"role": "user", "content": prompt}]
+        cache_key = self._cache_key(messages, temperature, max_tokens)
+        with tracer.span(label, temperature=temperature, max_tokens=max_tokens,
+                         stream=True) as span:
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                span["outcome"] = "cached"
+                yield cached
+                return
+            parts: List[str] = []
+            estimate = estimate_tokens(prompt) + max_tokens
+            attempt = 0
+            while True:
+                queued_at = time.perf_counter()
+                async with self.rate_limiter.slot(estimate) as permit:
+                    span["queued"] = span.get("queued", 0.0) + time.perf_counter() - queued_at
+                    try:
+                        stream, headers = await self._create(
+                            messages=messages, temperature=temperature, max_tokens=max_tokens,
+                            stream=True,
+                        )
+                    except Exception as e:
+                        delay = self._retry_delay(e, attempt, span)
+                        if delay is None:
+                            raise
+                    else:
+                        async for chunk in stream:
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if delta:
+                                if not parts:
+                                    span["first_token"] = time.perf_counter() - queued_at
+                                parts.append(delta)
+                                yield delta
+                        # Streamed chunks carry no usage block, so token counts are estimates
+                        permit.succeeded(estimate_tokens(prompt + "".join(parts)), headers)
+                        break
+                attempt += 1
+                await asyncio.sleep(delay)
+            content = "".join(parts).strip()
+            span["prompt_tokens"] = estimate_tokens(prompt)
+            span["completion_tokens"] = estimate_tokens(content)
+            self._store_content(cache_key, content, estimate_tokens(prompt + content))
+
+    async def stream_plan(self, user_query: str) -> AsyncIterator[Tuple[str, List[str]]]:
+        """Yield (search_type, terms) as soon as each plan line has streamed in"""
+        search_plan: Dict[str, List[str]] = {search_type: [] for search_type in PLAN_LAYERS}
+        buffer = ""
+
+        def take(line):
+            parsed = self._parse_plan_line(line.strip())
+            if parsed and parsed[1] and not search_plan[parsed[0]]:
+                search_plan[parsed[0]] = parsed[1]
+                return parsed
+            return None
+
+        try:
+            async for delta in self._chat_stream(self._plan_prompt(user_query), temperature=0.3,
+                                                 max_tokens=300, label="llm.plan"):
+                buffer += delta
+                *lines, buffer = buffer.split('\n')
+                for line in lines:
+                    parsed = take(line)
+                    if parsed:
+                        yield parsed
+            parsed = take(buffer)
+            if parsed:
+                yield parsed
+        except Exception as e:
+            print(f"❌ Failed to break down query: {e}")
+        if not any(search_plan.values()):
+            search_plan = self._fallback_plan(user_query)
+            yield 'primary', search_plan['primary']
+        self._print_plan(search_plan)
+
+    async def break_down_query(self, user_query: str) -> Dict[str, List[str]]:
+        """Break query into multiple research layers for deep search"""
+        try:
+            text = await self._chat(self._plan_prompt(user_query), temperature=0.3, max_tokens=300,
+                                    label="llm.plan")
+            return self._parse_plan(text)
+        except Exception as e:
+            print(f"❌ Failed to break down query: {e}")
+            return self._fallback_plan(user_query)
+
+    async def extract_answer_from_content(self, content: str, search_term: str,
+                                          search_type: str) -> str:
+        """Enhanced extraction based on search type"""
+        try:
+            answer = await self._chat(self._extraction_prompt(content, search_term, search_type),
+                                      temperature=0, max_tokens=200, label="llm.extract")
+            print(f"✅ Extracted {search_type} answer for '{search_term}': {answer[:100]}...")
+            return answer
+        except Exception as e:
+            print(f"❌ Failed to extract {search_type} answer: {e}")
+            return "Could not extract answer"
+
+    async def extract_answers_batch(self, items: List[Dict]) -> List[str]:
+        """Extract answers for many (search_term, search_type, content) items in few requests.
+
+        Batches run concurrently; items the model skips fall back to extract_answer_from_content.
+        """
+        async def run_batch(batch):
+            batch_items = [items[i] for i in batch]
+            parsed = {}
+            if len(batch) > 1:
+                try:
+                    text = await self._chat(self._batch_prompt(batch_items), temperature=0,
+                                            max_tokens=min(200 * len(batch), 4000),
+                                            label="llm.batch_extract")
+                    parsed = self._parse_batch(text, len(batch))
+                    print(f"✅ Batch-extracted {len(parsed)}/{len(batch)} answers in one request")
+                except Exception as e:
+                    print(f"❌ Batch extraction failed, falling back to single requests: {e}")
+            missing = [offset for offset in range(len(batch)) if offset not in parsed]
+            retried = await asyncio.gather(*(
+                self.extract_answer_from_content(batch_items[offset]['content'],
+                                                 batch_items[offset]['search_term'],
+                                                 batch_items[offset]['search_type'])
+                for offset in missing
+            ))
+            parsed.update(zip(missing, retried))
+            return [(i, parsed[offset]) for offset, i in enumerate(batch)]
+
+        answers: List[str] = [""] * len(items)
+        batches = self._pack_batches(items)
+        for batch_answers in await asyncio.gather(*(run_batch(batch) for batch in batches)):
+            for i, answer in batch_answers:
+                answers[i] = answer
+        return answers
+
+    async def analyze_contradictions(self, verification_results: List[Dict]) -> str:
+        """Analyze verification results for contradictions"""
+        if not verification_results:
+            return "No verification data available"
+
+        try:
+            return await self._chat(self._contradiction_prompt(verification_results),
+                                    temperature=0.2, max_tokens=300, label="llm.contradictions")
+        except Exception as e:
+            print(f"❌ Failed to analyze contradictions: {e}")
+            return "Could not analyze verification data"
+
+    async def synthesize_comprehensive_answer(self, user_query: str, all_results: Dict,
+                                              contradiction_analysis: str,
+                                              stream: bool = False) -> str:
+        """Synthesize all research layers into comprehensive answer.
+
+        With stream=True the answer is also written to the terminal token by token as it arrives.
+        """
+        findings_by_type, all_sources = self._collect_findings(all_results)
+        if stream:
+            return await self._stream_synthesis(user_query, all_results, contradiction_analysis,
+                                                findings_by_type, all_sources)
+        try:
+            final_answer = await self._chat(
+                self._synthesis_prompt(user_query, findings_by_type, contradiction_analysis),
+                temperature=0.3,
+                max_tokens=800,
+                label="llm.synthesis"
             )
+            print("✅ Generated comprehensive deep research answer")
+            return self._format_synthesis(final_answer, all_results, all_sources)
+        except Exception as e:
+            print(f"❌ Failed to synthesize comprehensive answer: {e}")
+            return self._synthesis_failure()
+
+    async def _stream_synthesis(self, user_query: str, all_results: Dict,
+                                contradiction_analysis: str, findings_by_type: Dict,
+                                all_sources: set) -> str:
+        parts: List[str] = []
+        try:
+            sys.stdout.write(self._synthesis_header())
+            async for delta in self._chat_stream(
+                self._synthesis_prompt(user_query, findings_by_type, contradiction_analysis),
+                temperature=0.3,
+                max_tokens=800,
+                label="llm.synthesis"
+            ):
+                parts.append(delta)
+                sys.stdout.write(delta)
+                sys.stdout.flush()
+            final_answer = "".join(parts).strip()
+            footer = self._synthesis_footer(all_results, all_sources)
+            sys.stdout.write(f"\n\n{footer}")
+            sys.stdout.flush()
+            return self._format_synthesis(final_answer, all_results, all_sources)
+        except Exception as e:
+            print(f"\n❌ Failed to synthesize comprehensive answer: {e}")
+            print(self._synthesis_failure())
+            return self._synthesis_failure()
@@ -1,2 +1,3 @@
 #!/bin/bash
 echo "Running benchmarks..."
+python -m benchmarks.run_benchmark "$@"
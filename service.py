@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""service module."""
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from research_agent import SUCCESS_MARKER
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def read_batch(input_path: str) -> List[Tuple[object, str]]:
+    """(id, query) for every line of a JSONL batch file.
+
+    Each line is either {"query": ..., "id": ...} or a bare JSON string; the id defaults to
+    the line number. Blank lines are skipped and a line without a usable query is a ValueError.
+    """
+    jobs = []
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"query": record}
+            query = record.get("query") if isinstance(record, dict) else None
+            if not isinstance(query, str) or not query.strip():
+                raise ValueError(f"{input_path}:{line_number}: expected a query string")
+            jobs.append((record.get("id", line_number), query.strip()))
+    return jobs
+
+
+class ResearchService:
+    """Runs many research_query jobs on one WorkAI under a global concurrency cap.
+
+    Every job shares the WorkAI instance, so they share the warm browser and its page pool,
+    the page/search/LLM caches and the researcher's LLM in-flight budget.
+    """
+
+    def __init__(self, workai, max_concurrent: Optional[int] = None):
+        self.workai = workai
+        self.max_concurrent = max(1, max_concurrent or int(os.getenv("RESEARCH_CONCURRENCY", "4")))
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self.started_at = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.total_duration = 0.0
+
+    async def submit(self, query: str, job_id=None) -> Dict:
+        """Research one query once a slot is free and return a JSON-serialisable result"""
+        async with self._slots:
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                answer = await self.workai.research_query(query)
+            except Exception as e:
+                answer = f"Sorry, deep research failed due to: {str(e)}"
+            finally:
+                self.in_flight -= 1
+            duration = time.perf_counter() - started
+        ok = SUCCESS_MARKER in answer
+        self.total_duration += duration
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        return {"id": job_id, "query": query, "ok": ok, "answer": answer,
+                "duration": round(duration, 3)}
+
+    def stats(self) -> Dict:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        done = self.completed + self.failed
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "uptime": round(elapsed, 1),
+            "queries_per_hour": round(3600 * done / elapsed, 1),
+            "mean_duration": round(self.total_duration / done, 2) if done else 0.0
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"📊 Throughput: {stats['completed']} ok, {stats['failed']} failed "
+              f"in {stats['uptime']}s → {stats['queries_per_hour']} queries/hour "
+              f"(mean {stats['mean_duration']}s per query)")
+
+    # --- batch mode ------------------------------------------------------
+
+    async def run_batch(self, input_path: str, output_path: str) -> Dict:
+        """Research every query of a read_batch file; results are appended to output_path"""
+        jobs = read_batch(input_path)
+
+        print(f"📥 Batch: {len(jobs)} queries, up to {self.max_concurrent} at a time")
+        self.started_at = time.time()
+        with open(output_path, "a", encoding="utf-8") as out:
+            pending = [self.submit(query, job_id) for job_id, query in jobs]
+            for done, finished in enumerate(asyncio.as_completed(pending), 1):
+                result = await finished
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                status = "✅" if result["ok"] else "❌"
+                print(f"{status} [{done}/{len(jobs)}] {result['query'][:60]} "
+                      f"({result['duration']}s)")
+        self.print_stats()
+        return self.stats()
+
+    # --- HTTP service mode ----------------------------------------------
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        """Minimal local HTTP API: POST /research {"query": ...}, GET /stats, GET /health"""
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"🌐 WORKAI service listening on http://{host}:{port} "
+              f"(max {self.max_concurrent} concurrent queries)")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", "0") or 0))
+            if len(request_line) < 2:
+                return await self._respond(writer, 400, {"error": "bad request"})
+            method, path = request_line[0], request_line[1].split("?")[0]
+
+            if method == "GET" and path == "/health":
+                return await self._respond(writer, 200, {"status": "ok"})
+            if method == "GET" and path == "/stats":
+                return await self._respond(writer, 200, self.stats())
+            if method == "POST" and path == "/research":
+                try:
+                    payload = json.loads(body or b"{}")
+                    query = payload["query"].strip()
+                    if not query:
+                        raise ValueError("blank query")
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    return await self._respond(
+                        writer, 400, {"error": 'expected JSON body {"query": "..."}'}
+                    )
+                result = await self.submit(query, payload.get("id"))
+                return await self._respond(writer, 200 if result["ok"] else 502, result)
+            return await self._respond(writer, 404, {"error": "not found"})
+        except Exception as e:
+            print(f"❌ Service request failed: {e}")
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Dict):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 502: "Bad Gateway"}
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {reasons.get(status, 'OK')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
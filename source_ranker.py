@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""source_ranker module."""
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from cache import PersistentCache
+
+# Domain suffix → credibility (0-10); the longest matching suffix wins
+DEFAULT_CREDIBILITY = {
+    "edu": 10, "gov": 10, "org": 10, "gov.uk": 10, "ac.uk": 10, "gov.in": 10, "nic.in": 10,
+    "ac.in": 10, "edu.au": 10, "gov.au": 10,
+    "reuters.com": 9, "bbc.com": 9, "bbc.co.uk": 9, "apnews.com": 9,
+    "cnn.com": 8, "ndtv.com": 8, "firstpost.com": 8,
+    "wikipedia.org": 7,
+    "com": 5, "in": 5, "uk": 5
+}
+DEFAULT_SCORE = 3
+
+
+def domain_of(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class DomainHistory:
+    """Fetch and extraction outcomes for one domain"""
+
+    __slots__ = ("fetches", "fetch_failures", "fetch_seconds", "extractions", "answers")
+
+    def __init__(self, fetches=0, fetch_failures=0, fetch_seconds=0.0, extractions=0, answers=0):
+        self.fetches = fetches
+        self.fetch_failures = fetch_failures
+        self.fetch_seconds = fetch_seconds
+        self.extractions = extractions
+        self.answers = answers
+
+    def to_json(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def add(self, deltas: Dict[str, float]) -> "DomainHistory":
+        for name, delta in deltas.items():
+            setattr(self, name, getattr(self, name) + delta)
+        return self
+
+    @property
+    def mean_latency(self) -> float:
+        return self.fetch_seconds / self.fetches if self.fetches else 0.0
+
+    def payoff(self, prior: float, prior_weight: float) -> float:
+        """Smoothed chance that a fetch from this domain ends in a usable answer"""
+        fetched = ((self.fetches - self.fetch_failures + prior_weight)
+                   / (self.fetches + prior_weight))
+        answered = (self.answers + prior * prior_weight) / (self.extractions + prior_weight)
+        return fetched * answered
+
+
+class SourceRanker:
+    """Scores and orders search results by credibility, search position and domain history.
+
+    score = credibility − position_penalty × (position − 1)
+            + history_weight × (payoff − prior) − min(2, mean fetch latency / 10s)
+
+    payoff is the smoothed fetch success × extraction success rate of the domain, so a
+    domain without history scores on credibility and position alone. Domains that were
+    tried at least skip_after times and almost never paid off are dropped from the ranking
+    (unless that would leave nothing to try). History is kept in the shared SQLite cache;
+    every update increments the stored record, so several processes can share it, and the
+    last history_kept domains are also held in memory.
+    """
+
+    def __init__(self, credibility: Optional[Dict[str, float]] = None,
+                 store: Optional[PersistentCache] = None,
+                 position_penalty: float = 0.75, history_weight: float = 6.0, prior: float = 0.6,
+                 prior_weight: float = 2.0, skip_after: int = 5, skip_below: float = 0.2,
+                 history_kept: int = 4096):
+        self.credibility_table: Dict[str, float] = dict(DEFAULT_CREDIBILITY)
+        self.credibility_table.update(credibility or {})
+        self.store = store
+        self.position_penalty = position_penalty
+        self.history_weight = history_weight
+        self.prior = prior
+        self.prior_weight = prior_weight
+        self.skip_after = skip_after
+        self.skip_below = skip_below
+        self.history_kept = history_kept
+        self._history: OrderedDict[str, DomainHistory] = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "SourceRanker":
+        credibility = None
+        path = os.getenv("SOURCE_CREDIBILITY_FILE")
+        if path:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    credibility = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not load SOURCE_CREDIBILITY_FILE {path}: {e}")
+        store = None
+        if os.getenv("SOURCE_HISTORY", "True") == "True":
+            ttl = float(os.getenv("SOURCE_HISTORY_TTL", str(30 * 86400)))
+            store = PersistentCache("domains", ttl=ttl, max_bytes=16 * 1024 * 1024)
+        return cls(credibility, store, skip_after=int(os.getenv("SOURCE_SKIP_AFTER", "5")),
+                   history_kept=int(os.getenv("SOURCE_HISTORY_KEPT", "4096")))
+
+    def credibility(self, url: str) -> float:
+        labels = domain_of(url).split(".")
+        for start in range(len(labels)):
+            score = self.credibility_table.get(".".join(labels[start:]))
+            if score is not None:
+                return score
+        return DEFAULT_SCORE
+
+    def history(self, domain: str) -> DomainHistory:
+        history = self._history.get(domain)
+        if history is None:
+            stored = self.store.get_json(domain) if self.store else None
+            history = DomainHistory(**stored) if stored else DomainHistory()
+        self._remember(domain, history)
+        return history
+
+    def _remember(self, domain: str, history: DomainHistory):
+        self._history[domain] = history
+        self._history.move_to_end(domain)
+        while len(self._history) > self.history_kept:
+            self._history.popitem(last=False)
+
+    def _save(self, domain: str, deltas: Dict[str, float]):
+        """Add deltas to the domain's history, incrementing the stored record, not overwriting it"""
+        if not self.store:
+            self.history(domain).add(deltas)
+            return
+        stored = self.store.update_json(
+            domain, lambda current: DomainHistory(**(current or {})).add(deltas).to_json()
+        )
+        self._remember(domain, DomainHistory(**stored))
+
+    def _never_pays_off(self, history: DomainHistory) -> bool:
+        return (history.fetches >= self.skip_after
+                and history.payoff(self.prior, self.prior_weight) < self.skip_below)
+
+    def score_results(self, results: List[Dict]) -> List[float]:
+        """Scores for a whole result list; each domain's history is loaded once"""
+        domains = {domain_of(result['url']) for result in results}
+        histories = {domain: self.history(domain) for domain in domains}
+        scores = []
+        for result in results:
+            history = histories[domain_of(result['url'])]
+            score = self.credibility(result['url'])
+            score -= self.position_penalty * (result['position'] - 1)
+            score += self.history_weight * (history.payoff(self.prior, self.prior_weight)
+                                            - self.prior)
+            score -= min(2.0, history.mean_latency / 10)
+            scores.append(score)
+        return scores
+
+    def rank(self, results: List[Dict]) -> List[Dict]:
+        scored = sorted(zip(self.score_results(results), range(len(results))),
+                        key=lambda pair: pair[0], reverse=True)
+        ranked = [results[i] for _, i in scored]
+        useful = [result for result in ranked
+                  if not self._never_pays_off(self.history(domain_of(result['url'])))]
+        return useful or ranked
+
+    def record_fetch(self, url: str, seconds: float, ok: bool):
+        self._save(domain_of(url), {"fetches": 1, "fetch_seconds": seconds,
+                                    "fetch_failures": 0 if ok else 1})
+
+    def record_extraction(self, url: str, answered: bool):
+        self._save(domain_of(url), {"extractions": 1, "answers": 1 if answered else 0})
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for cache."""
+import os
+import time
+
+from cache import PersistentCache, normalize_query, normalize_url
+
+
+def test_normalize_url_folds_equivalent_urls():
+    url = "https://WWW.Example.com/a/?utm_source=x&b=2&a=1#top"
+    assert normalize_url(url) == "https://example.com/a?a=1&b=2"
+    assert normalize_url("https://example.com") == normalize_url("https://example.com/")
+
+
+def test_normalize_query_folds_case_punctuation_and_order():
+    assert normalize_query("AI in  Medicine, 2024!") == normalize_query("2024 medicine ai in")
+    assert normalize_query("GPT-4 release") != normalize_query("GPT-5 release")
+
+
+def test_normalize_query_keeps_language_suffixes():
+    keys = {normalize_query(query) for query in ("C++ tutorial", "c# tutorial", "C tutorial")}
+    assert len(keys) == 3
+    assert normalize_query("tutorial,  C++!") == normalize_query("c++ tutorial")
+
+
+def test_persistent_cache_roundtrip_and_stats(tmp_path):
+    cache = PersistentCache("pages", path=str(tmp_path / "cache.sqlite3"))
+    assert cache.get("k") is None
+    cache.set("k", "hello " * 100)
+    assert cache.get("k") == "hello " * 100
+    cache.set_json("results", [{"title": "t", "url": "https://a.org", "position": 1}])
+    assert cache.get_json("results")[0]["position"] == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 2)
+
+
+def test_persistent_cache_ttl_expiry(tmp_path):
+    cache = PersistentCache("pages", path=str(tmp_path / "cache.sqlite3"), ttl=0.01)
+    cache.set("k", "v")
+    time.sleep(0.05)
+    assert cache.get("k") is None
+
+
+def test_persistent_cache_evicts_least_recently_used(tmp_path):
+    cache = PersistentCache("pages", path=str(tmp_path / "cache.sqlite3"), max_bytes=1200)
+    cache.set("old", os.urandom(500).hex())
+    cache.set("new", os.urandom(500).hex())
+    cache.get("new")
+    cache.set("newest", os.urandom(500).hex())
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+    assert cache.get("newest") is not None
+
+
+def test_persistent_cache_namespaces_share_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    PersistentCache("pages", path=path).set("k", "page")
+    assert PersistentCache("search", path=path).get("k") is None
+    assert PersistentCache("pages", path=path).get("k") == "page"
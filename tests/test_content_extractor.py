@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for content_extractor."""
+from content_extractor import extract_main_text, needs_browser
+
+ARTICLE = "The committee published its findings on 12 March with detailed figures. " * 3
+
+
+def test_extract_main_text_prefers_article_over_body():
+    html = f"""<html><head><title>t</title><style>p {{}}</style></head><body>
+    <nav>Home | News</nav><script>var x = 1;</script>
+    <article><h1>Report</h1><p>{ARTICLE}</p></article>
+    <footer>Copyright</footer></body></html>"""
+    text = extract_main_text(html)
+    assert text.startswith("Report\nThe committee")
+    assert "Home" not in text and "var x" not in text
+
+
+def test_extract_main_text_follows_selector_priority():
+    html = f'<body><div class="sidebar">short</div><div id="content"><p>{ARTICLE}</p></div></body>'
+    assert extract_main_text(html).startswith("The committee")
+
+
+def test_extract_main_text_falls_back_to_body_for_thin_containers():
+    html = f"<body><main>tiny</main><div><p>{ARTICLE}</p></div></body>"
+    assert "The committee" in extract_main_text(html)
+
+
+def test_needs_browser_for_js_shell_pages():
+    shell = ('<body><div id="root"></div>'
+             '<noscript>You need to enable JavaScript to run this app.</noscript></body>')
+    assert needs_browser(shell, extract_main_text(shell))
+    assert not needs_browser(f"<p>{ARTICLE}</p>", ARTICLE)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for dedup."""
+from cache import PersistentCache
+from dedup import NearDuplicateIndex, hamming_distance, simhash
+
+ARTICLE = " ".join(
+    f"Paragraph {i} reports that solar panel efficiency rose to {18 + i % 5} percent "
+    f"in field trials run by lab {i}."
+    for i in range(40)
+)
+UNRELATED = " ".join(
+    f"Recipe step {i}: whisk {i + 2} eggs with flour, "
+    f"then bake the batter for {20 + i} minutes until golden."
+    for i in range(40)
+)
+
+
+def test_simhash_is_close_for_mirrors_and_far_for_unrelated_text():
+    mirror = ("Syndicated from Example Wire. " + ARTICLE.replace("field trials", "field tests", 1)
+              + " Share this story.")
+    assert hamming_distance(simhash(ARTICLE), simhash(mirror)) <= 6
+    assert hamming_distance(simhash(ARTICLE), simhash(UNRELATED)) > 10
+
+
+def test_index_finds_mirror_and_reuses_answer_for_same_term_only():
+    index = NearDuplicateIndex()
+    original = index.fingerprint(ARTICLE)
+    index.add(original, "https://a.example/story")
+    index.record_answer(original, "Solar panel efficiency", "primary", "About 20 percent")
+
+    match = index.lookup(index.fingerprint(ARTICLE + " Related: more stories."))
+    assert match is not None and match[1]["url"] == "https://a.example/story"
+    assert index.answer(match[0], "solar panel EFFICIENCY", "primary") == "About 20 percent"
+    assert index.answer(match[0], "solar panel history", "primary") is None
+    assert index.lookup(index.fingerprint(UNRELATED)) is None
+
+
+def test_short_text_is_not_fingerprinted():
+    assert NearDuplicateIndex().fingerprint("Too short to compare.") is None
+
+
+def test_persistent_store_survives_new_index(tmp_path):
+    store = PersistentCache("dedup", path=str(tmp_path / "cache.sqlite3"))
+    first = NearDuplicateIndex(store=store)
+    fingerprint = first.fingerprint(ARTICLE)
+    first.add(fingerprint, "https://a.example/story")
+    first.record_answer(fingerprint, "solar panel efficiency", "primary", "About 20 percent")
+
+    second = NearDuplicateIndex(store=store)
+    match = second.lookup(second.fingerprint(ARTICLE))
+    assert match is not None
+    assert second.answer(match[0], "solar panel efficiency", "primary") == "About 20 percent"
+    store.close()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for instrumentation."""
+import json
+
+import pytest
+
+from instrumentation import Tracer, percentile
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_spans_record_attributes_and_errors():
+    tracer = Tracer(export=False)
+    with tracer.span("llm.extract") as span:
+        span["prompt_tokens"] = 120
+    with pytest.raises(ValueError):
+        with tracer.span("browser.extract_page_content"):
+            raise ValueError("boom")
+    summary = tracer.summary()
+    assert summary["llm.extract"]["prompt_tokens"] == 120
+    assert summary["browser.extract_page_content"]["errors"] == 1
+
+
+def test_query_trace_exports_json_and_chrome_trace(tmp_path):
+    tracer = Tracer(trace_dir=str(tmp_path), export=True)
+    with tracer.query("What is BM25?") as trace:
+        with tracer.span("browser.duckduckgo_search", query="bm25"):
+            pass
+    files = sorted(path.name for path in tmp_path.iterdir())
+    assert len(files) == 2 and files[1].endswith(".trace.json")
+    chrome = json.loads((tmp_path / files[1]).read_text())
+    names = {event["name"] for event in chrome["traceEvents"]}
+    assert names == {"research_query", "browser.duckduckgo_search"}
+    assert trace.to_json()["summary"]["browser.duckduckgo_search"]["count"] == 1
+
+
+def test_current_trace_counts_tokens_of_finished_llm_calls():
+    tracer = Tracer(export=False)
+    assert tracer.current() is None
+    with tracer.query("budgeted") as trace:
+        with tracer.span("llm.extract") as span:
+            span.update(prompt_tokens=300, completion_tokens=40)
+        with tracer.span("llm.synthesis"):
+            assert tracer.current() is trace
+    assert trace.tokens() == 340
+
+
+def test_process_summary_keeps_only_the_most_recent_spans():
+    tracer = Tracer(export=False, max_spans=3)
+    for _ in range(5):
+        with tracer.query("repeated"):
+            pass
+    assert len(tracer.spans) == 3
+    assert tracer.summary()["research_query"]["count"] == 3
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for knowledge_index."""
+import time
+
+from knowledge_index import KnowledgeIndex, overlap
+
+RESULTS = {
+    "primary": [
+        {"search_term": "solar panel efficiency",
+         "answer": "Commercial panels reach 22% efficiency.",
+         "source": "https://energy.gov/solar", "search_type": "primary"}
+    ],
+    "recent": [
+        {"search_term": "solar panel efficiency 2024", "answer": "A 2024 record cell hit 33.9%.",
+         "source": "https://news.example.com/a", "search_type": "recent"}
+    ]
+}
+
+
+def test_overlap_ignores_case_order_and_stopwords():
+    assert overlap("What is the efficiency of solar panels?", "solar panels efficiency") == 1.0
+    assert overlap("solar panel efficiency", "wind turbine noise") == 0.0
+
+
+def test_serves_near_identical_query_and_reuses_findings(tmp_path):
+    index = KnowledgeIndex(path=str(tmp_path / "knowledge.sqlite3"))
+    index.record_research("How efficient are solar panels?", "🤖 WORKAI DEEP RESEARCH COMPLETE ...",
+                          RESULTS)
+
+    answer = index.cached_answer("how efficient are SOLAR panels")
+    assert answer is not None and answer["text"].startswith("🤖 WORKAI")
+    assert index.cached_answer("How loud are wind turbines?") is None
+
+    finding = index.reusable_finding("primary", "Solar panel efficiency")
+    assert finding["source"] == "https://energy.gov/solar"
+    # Findings are matched within their own layer
+    assert index.reusable_finding("secondary", "solar panel efficiency") is None
+    assert index.stats() == {"queries": 1, "findings": 2, "terms": index.stats()["terms"]}
+    index.close()
+
+
+def test_stale_entries_are_not_reused(tmp_path):
+    index = KnowledgeIndex(path=str(tmp_path / "knowledge.sqlite3"), answer_max_age=86400,
+                           recent_max_age=3600)
+    index.record_research("How efficient are solar panels?", "old answer", RESULTS,
+                          created_at=time.time() - 2 * 86400)
+    assert index.cached_answer("How efficient are solar panels?") is None
+    assert index.reusable_finding("recent", "solar panel efficiency 2024") is None
+    # Primary findings stay fresh for a week by default
+    assert index.reusable_finding("primary", "solar panel efficiency") is not None
+    index.close()
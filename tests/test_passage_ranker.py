@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for passage_ranker."""
+from passage_ranker import bm25_scores, estimate_tokens, select_passages, split_passages
+
+FILLER = "Cookie settings and newsletter signup links appear on every page of this site. " * 4
+
+
+def test_split_passages_merges_short_lines_and_cuts_long_ones():
+    passages = split_passages("a\nb\n\n" + "Sentence one. " * 100, max_chars=200)
+    assert passages[0].startswith("a\nb")
+    assert all(len(passage) <= 200 for passage in passages)
+
+
+def test_bm25_prefers_passages_with_query_terms():
+    passages = [FILLER, "The Eiffel Tower is 330 metres tall.", FILLER]
+    scores = bm25_scores(passages, "Eiffel Tower height")
+    assert scores[1] > scores[0] == scores[2]
+
+
+def test_select_passages_keeps_relevant_paragraph_within_budget():
+    content = "\n".join([FILLER] * 20 + ["The Eiffel Tower is 330 metres tall."] + [FILLER] * 20)
+    selected = select_passages(content, "Eiffel Tower height", token_budget=200)
+    assert "330 metres" in selected
+    assert estimate_tokens(selected) <= 200
+
+
+def test_select_passages_returns_short_content_unchanged():
+    assert select_passages("short page", "anything") == "short page"
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for pipeline."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("groq")
+
+from knowledge_index import KnowledgeIndex
+from pipeline import ResearchPipeline
+
+
+class PlanOnlyResearcher:
+    max_concurrency = 2
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    async def stream_plan(self, user_query):
+        for search_type, terms in self.plan:
+            yield search_type, terms
+
+    def research_confidence(self, all_results):
+        return 100.0
+
+
+class SlotResearcher(PlanOnlyResearcher):
+    """Every LLM call, including the whole streamed plan, holds one of `slots` limiter slots"""
+
+    batch_max_items = 4
+
+    def __init__(self, plan, slots=1):
+        super().__init__(plan)
+        self.max_concurrency = slots
+        self.slot = asyncio.Semaphore(slots)
+        self.extractions = {}
+
+    async def stream_plan(self, user_query):
+        async with self.slot:
+            for search_type, terms in self.plan:
+                await asyncio.sleep(0)
+                yield search_type, terms
+
+    async def extract_answer_from_content(self, content, search_term, search_type):
+        async with self.slot:
+            self.extractions[search_term] = self.extractions.get(search_term, 0) + 1
+            await asyncio.sleep(0.01)
+            return f"fact about {search_term}"
+
+    async def analyze_contradictions(self, verification_results):
+        return "No verification data available"
+
+    async def synthesize_comprehensive_answer(self, user_query, all_results, contradiction_analysis,
+                                              stream=False):
+        return "\n".join(result["answer"] for results in all_results.values() for result in results)
+
+
+class InstantBrowser:
+    max_pages = 2
+
+    def __init__(self):
+        self.fetch_paths = {}
+        self.source_ranker = SimpleNamespace(record_fetch=lambda *args: None,
+                                             record_extraction=lambda *args: None)
+
+    async def duckduckgo_search(self, query):
+        return [{"title": query, "url": f"https://site{i}.org/{i}", "position": i + 1}
+                for i in range(3)]
+
+    def rank_search_results(self, results):
+        return results
+
+    async def extract_page_content(self, url):
+        await asyncio.sleep(0)
+        return f"page text from {url}"
+
+
+def research_workai(researcher, **overrides):
+    settings = dict(
+        browser=InstantBrowser(), researcher=researcher, knowledge=None, max_sources=3,
+        hedge_fanout=2, hedge_delay=5.0, term_deadline=5.0, batch_extraction=False,
+        adaptive_depth=False, confidence_threshold=80.0, query_time_budget=0, query_token_budget=0,
+        near_duplicates=False, dedup_store=None
+    )
+    settings.update(overrides)
+    return SimpleNamespace(**settings)
+
+
+def test_plan_stream_holding_the_only_llm_slot_does_not_deadlock(monkeypatch):
+    monkeypatch.setenv("PIPELINE_QUEUE_SIZE", "1")
+    monkeypatch.setenv("PIPELINE_SEARCH_WORKERS", "1")
+    plan = [("primary", [f"term {i}" for i in range(6)]), ("secondary", ["context a", "context b"])]
+    researcher = SlotResearcher(plan)
+
+    async def run():
+        pipeline = ResearchPipeline(research_workai(researcher))
+        return await asyncio.wait_for(pipeline.run("query"), timeout=5)
+
+    answer = asyncio.run(run())
+    assert answer.count("fact about") == 8
+
+
+def test_each_term_is_extracted_once_when_its_first_source_answers():
+    plan = [("primary", [f"term {i}" for i in range(4)]), ("secondary", ["context a", "context b"]),
+            ("recent", ["term 2024"])]
+    researcher = SlotResearcher(plan, slots=4)
+
+    async def run():
+        pipeline = ResearchPipeline(research_workai(researcher, hedge_fanout=2))
+        return await asyncio.wait_for(pipeline.run("query"), timeout=5)
+
+    asyncio.run(run())
+    # Both hedged pages of every term are fetched, but only the first one goes to the LLM
+    assert researcher.extractions == {term: 1 for _, terms in plan for term in terms}
+
+
+def test_reused_primary_term_does_not_trim_before_layer_is_planned(tmp_path):
+    index = KnowledgeIndex(path=str(tmp_path / "knowledge.sqlite3"))
+    index.record_research("solar power", "🤖 WORKAI DEEP RESEARCH COMPLETE ...", {"primary": [
+        {"search_term": "solar panel efficiency",
+         "answer": "Commercial panels reach 22% efficiency.",
+         "source": "https://energy.gov/solar", "search_type": "primary"}
+    ]})
+    plan = [
+        ("primary", ["solar panel efficiency", "wind turbine noise", "hydro dam output"]),
+        ("secondary", ["grid storage cost"])
+    ]
+    workai = SimpleNamespace(
+        browser=SimpleNamespace(max_pages=2), researcher=PlanOnlyResearcher(plan), knowledge=index,
+        adaptive_depth=True, confidence_threshold=80.0, near_duplicates=False, dedup_store=None
+    )
+
+    async def run():
+        pipeline = ResearchPipeline(workai)
+        await pipeline.plan_stage("solar power")
+        primary = pipeline.layers["primary"]
+        assert [job.reused for job in primary] == [True, False, False]
+        # The other primary terms are still open, so confidence must not have been judged yet
+        assert not pipeline.trimmed
+        assert not pipeline.layers["secondary"][0].finished
+
+        for job in primary[1:]:
+            pipeline.finish(job, job.finding("fact", "https://example.org"))
+        assert pipeline.trimmed
+        assert pipeline.layers["secondary"][0].trimmed
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for rate_limiter."""
+import asyncio
+
+from rate_limiter import RateLimiter, TokenBucket, parse_duration, parse_retry_after
+
+
+def test_parse_duration_handles_groq_reset_formats():
+    assert parse_duration("7.66s") == 7.66
+    assert abs(parse_duration("2m59.56s") - 179.56) < 1e-9
+    assert parse_duration("120ms") == 0.12
+    assert parse_duration("3") == 3.0
+    assert parse_duration("soon") is None
+
+
+def test_parse_retry_after_prefers_milliseconds():
+    assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert parse_retry_after({"retry-after": "2"}) == 2.0
+    assert parse_retry_after({}) is None
+
+
+def test_token_bucket_waits_for_refill_and_trusts_lower_server_count():
+    bucket = TokenBucket(per_minute=600)
+    bucket.take(600, now=bucket.updated)
+    assert abs(bucket.delay(60, now=bucket.updated) - 6.0) < 1e-6
+    bucket.give_back(600)
+    bucket.observe(10, now=bucket.updated)
+    assert bucket.level == 10
+    assert TokenBucket(per_minute=0).delay(10 ** 9, now=0) == 0.0
+
+
+def test_concurrency_halves_once_per_storm_and_recovers_additively():
+    limiter = RateLimiter(max_concurrency=8, base_delay=0.01)
+    assert limiter.retry_delay(0, status=429, headers={"retry-after": "0"}) is not None
+    limiter.retry_delay(0, status=429)
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.record_success()
+    assert limiter.limit == 5
+
+
+def test_retry_delay_gives_up_on_client_errors_and_after_max_retries():
+    limiter = RateLimiter(max_retries=2, base_delay=1.0)
+    assert limiter.retry_delay(0, status=400) is None
+    assert 1.0 <= limiter.retry_delay(1, status=503) <= 2.0
+    assert limiter.retry_delay(0, transient=True) is not None
+    assert limiter.retry_delay(2, status=503) is None
+
+
+def test_slot_caps_requests_in_flight():
+    limiter = RateLimiter(max_concurrency=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot(10) as permit:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            permit.succeeded(12)
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2 and limiter.in_flight == 0
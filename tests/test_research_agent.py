@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for research_agent."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("groq")
+
+from research_agent import AsyncWorkAIResearcher, ResearcherBase, WorkAIResearcher
+
+
+@pytest.fixture
+def researcher(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_CACHE", "False")
+    monkeypatch.setenv("PASSAGE_TOKEN_BUDGET", "100")
+    monkeypatch.setenv("BATCH_TOKEN_BUDGET", "400")
+    monkeypatch.setenv("BATCH_MAX_ITEMS", "3")
+    return WorkAIResearcher()
+
+
+def streamed_plan(monkeypatch, deltas, error=None):
+    """Plan layers an AsyncWorkAIResearcher yields while the model streams deltas, then error"""
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_CACHE", "False")
+    researcher = AsyncWorkAIResearcher()
+
+    async def chat_stream(prompt, temperature, max_tokens, label="llm.chat"):
+        for delta in deltas:
+            yield delta
+        if error:
+            raise error
+
+    researcher._chat_stream = chat_stream
+
+    async def collect():
+        return [layer async for layer in researcher.stream_plan("solar power")]
+
+    return asyncio.run(collect())
+
+
+def test_researcher_base_needs_a_client(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    with pytest.raises(TypeError):
+        ResearcherBase()
+
+
+def test_parse_batch_reads_markdown_headers(researcher):
+    text = "### ITEM 1\nSolar panels reach 22%.\n\n### ITEM 2\nNo clear answer found\n"
+    assert researcher._parse_batch(text, 2) == {
+        0: "Solar panels reach 22%.", 1: "No clear answer found"
+    }
+
+
+def test_parse_batch_accepts_answers_on_the_header_line(researcher):
+    text = ("ITEM 1: Solar panels reach 22%.\nITEM 2: Wind turbines last 25 years.\n"
+            "**ITEM 3:** Dams emit methane.")
+    assert researcher._parse_batch(text, 3) == {
+        0: "Solar panels reach 22%.", 1: "Wind turbines last 25 years.", 2: "Dams emit methane."
+    }
+
+
+def test_parse_batch_only_splits_on_requested_numbered_headers(researcher):
+    text = ("### ITEM 1\nThe trial listed:\nitem 2\nas a secondary outcome.\n"
+            "### ITEM 2\nSecond answer.\n### ITEM 7\nNot requested.")
+    answers = researcher._parse_batch(text, 2)
+    assert answers[0] == "The trial listed:\nitem 2\nas a secondary outcome."
+    assert answers[1] == "Second answer.\n### ITEM 7\nNot requested."
+
+
+def test_parse_batch_leaves_out_missing_items(researcher):
+    assert researcher._parse_batch("### ITEM 2\nOnly the second.", 3) == {1: "Only the second."}
+    assert researcher._parse_batch("no headers at all", 2) == {}
+
+
+def test_pack_batches_respects_token_budget_and_item_limit(researcher):
+    short = {"content": "word " * 40}  # ~50 tokens + 60 overhead
+    long = {"content": "word " * 2000}  # capped at the passage budget: 100 + 60
+    assert researcher._pack_batches([short] * 7) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert researcher._pack_batches([long, long, long]) == [[0, 1], [2]]
+    assert researcher._pack_batches([]) == []
+
+
+def test_stream_plan_joins_lines_split_across_deltas(monkeypatch):
+    deltas = ["PRI", "MARY: solar panel", " efficiency, solar cost\nSECOND", "ARY: grid storage\n"]
+    assert streamed_plan(monkeypatch, deltas) == [
+        ("primary", ["solar panel efficiency", "solar cost"]), ("secondary", ["grid storage"])
+    ]
+
+
+def test_stream_plan_parses_a_last_line_without_newline(monkeypatch):
+    deltas = ["PRIMARY: solar cost\n", "RECENT: solar 2024"]
+    assert streamed_plan(monkeypatch, deltas) == [
+        ("primary", ["solar cost"]), ("recent", ["solar 2024"])
+    ]
+
+
+def test_stream_plan_keeps_the_first_line_of_a_repeated_layer(monkeypatch):
+    deltas = ["PRIMARY: solar cost\n", "Here is a revised plan:\n", "PRIMARY: something else\n"]
+    assert streamed_plan(monkeypatch, deltas) == [("primary", ["solar cost"])]
+
+
+def test_stream_plan_falls_back_to_the_query_when_the_stream_fails_early(monkeypatch):
+    assert streamed_plan(monkeypatch, ["Sure, "], error=ConnectionError("reset")) == [
+        ("primary", ["solar power"])
+    ]
+    # A plan line that did arrive is kept rather than replaced by the fallback
+    deltas = ["PRIMARY: solar cost\n"]
+    assert streamed_plan(monkeypatch, deltas, error=ConnectionError("reset")) == [
+        ("primary", ["solar cost"])
+    ]
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for service."""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("groq")
+
+from research_agent import SUCCESS_MARKER
+from service import ResearchService, read_batch
+
+
+class EchoWorkAI:
+    def __init__(self):
+        self.queries = []
+
+    async def research_query(self, query):
+        self.queries.append(query)
+        if query == "fail":
+            raise RuntimeError("search engine down")
+        return f"{SUCCESS_MARKER}\n{query}"
+
+
+async def request(service, raw: bytes):
+    server = await asyncio.start_server(service._handle_connection, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def post(body: bytes) -> bytes:
+    return (b"POST /research HTTP/1.1\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n" % len(body)) + body
+
+
+def test_http_routes():
+    workai = EchoWorkAI()
+    service = ResearchService(workai, max_concurrent=2)
+
+    async def run():
+        assert await request(service, b"GET /health HTTP/1.1\r\n\r\n") == (200, {"status": "ok"})
+        status, result = await request(service, post(b'{"query": " solar power ", "id": 7}'))
+        assert (status, result["ok"], result["id"]) == (200, True, 7)
+        assert result["query"] == "solar power"
+        status, result = await request(service, post(b'{"query": "fail"}'))
+        assert (status, result["ok"]) == (502, False)
+        status, stats = await request(service, b"GET /stats?verbose=1 HTTP/1.1\r\n\r\n")
+        assert (status, stats["completed"], stats["failed"]) == (200, 1, 1)
+        assert (await request(service, b"GET /nowhere HTTP/1.1\r\n\r\n"))[0] == 404
+
+    asyncio.run(run())
+    assert workai.queries == ["solar power", "fail"]
+
+
+@pytest.mark.parametrize("body", [
+    b"", b"not json", b"[]", b'"x"', b'{"query": 5}', b'{"query": "   "}'
+])
+def test_http_rejects_bad_research_bodies(body):
+    workai = EchoWorkAI()
+    status, result = asyncio.run(request(ResearchService(workai), post(body)))
+    assert status == 400
+    assert workai.queries == []
+
+
+def test_read_batch_accepts_objects_and_bare_strings(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    lines = ['{"query": "solar power", "id": "a"}', "", '"wind turbines"', '{"query": " hydro "}']
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    assert read_batch(str(path)) == [("a", "solar power"), (3, "wind turbines"), (4, "hydro")]
+
+
+@pytest.mark.parametrize("line", ['{"id": 1}', '{"query": "  "}', "[1, 2]", "{broken"])
+def test_read_batch_rejects_lines_without_a_query(tmp_path, line):
+    path = tmp_path / "queries.jsonl"
+    path.write_text(f'"fine"\n{line}\n', encoding="utf-8")
+    with pytest.raises(ValueError):
+        read_batch(str(path))
+
+
+def test_run_batch_writes_one_result_per_query(tmp_path):
+    source, output = tmp_path / "queries.jsonl", tmp_path / "results.jsonl"
+    source.write_text('"solar power"\n"fail"\n', encoding="utf-8")
+    stats = asyncio.run(ResearchService(EchoWorkAI()).run_batch(str(source), str(output)))
+    results = sorted((json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()),
+                     key=lambda result: result["id"])
+    assert [(result["id"], result["ok"]) for result in results] == [(1, True), (2, False)]
+    assert (stats["completed"], stats["failed"]) == (1, 1)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for source_ranker."""
+from cache import PersistentCache
+from source_ranker import SourceRanker, domain_of
+
+
+def results(*urls):
+    return [{"title": url, "url": url, "position": i + 1} for i, url in enumerate(urls)]
+
+
+def test_longest_suffix_wins_and_table_is_configurable():
+    ranker = SourceRanker({"example.com": 9})
+    assert ranker.credibility("https://en.wikipedia.org/wiki/X") == 7
+    assert ranker.credibility("https://www.gov.uk/guidance") == 10
+    assert ranker.credibility("https://news.example.com/a") == 9
+    assert ranker.credibility("https://blog.example.io/a") == 3
+    # Substrings elsewhere in the URL no longer count
+    assert ranker.credibility("https://spam.example.io/page.edu") == 3
+    assert domain_of("https://WWW.Reuters.com/world") == "reuters.com"
+
+
+def test_without_history_ranks_like_credibility_minus_position():
+    ranked = SourceRanker().rank(results("https://a.example.io/x", "https://b.example.edu/y"))
+    assert ranked[0]["url"] == "https://b.example.edu/y"
+
+
+def test_domains_that_never_pay_off_sink_and_are_skipped():
+    ranker = SourceRanker()
+    for _ in range(5):
+        ranker.record_fetch("https://paywalled.org/a", 9.0, ok=True)
+        ranker.record_extraction("https://paywalled.org/a", answered=False)
+    ranked = ranker.rank(results("https://paywalled.org/b", "https://useful.com/c"))
+    assert [result["url"] for result in ranked] == ["https://useful.com/c"]
+    # Skipping never leaves a term with nothing to try
+    assert len(ranker.rank(results("https://paywalled.org/b"))) == 1
+
+
+def test_history_is_persisted(tmp_path):
+    store = PersistentCache("domains", path=str(tmp_path / "cache.sqlite3"))
+    SourceRanker(store=store).record_fetch("https://slow.com/a", 30.0, ok=False)
+    history = SourceRanker(store=store).history("slow.com")
+    assert (history.fetches, history.fetch_failures, history.mean_latency) == (1, 1, 30.0)
+    store.close()
+
+
+def test_rankers_sharing_a_store_add_to_each_others_counts(tmp_path):
+    store = PersistentCache("domains", path=str(tmp_path / "cache.sqlite3"))
+    first, second = SourceRanker(store=store), SourceRanker(store=store)
+    first.history("shared.com")
+    second.history("shared.com")
+    first.record_fetch("https://shared.com/a", 1.0, ok=True)
+    second.record_fetch("https://shared.com/b", 3.0, ok=False)
+    second.record_extraction("https://shared.com/b", answered=True)
+    history = SourceRanker(store=store).history("shared.com")
+    assert (history.fetches, history.fetch_failures, history.fetch_seconds) == (2, 1, 4.0)
+    assert history.answers == 1
+    assert second.history("shared.com").fetches == 2
+    store.close()
+
+
+def test_in_memory_history_is_bounded():
+    ranker = SourceRanker(history_kept=2)
+    for domain in ("a.com", "b.com", "c.com"):
+        ranker.record_fetch(f"https://{domain}/", 1.0, ok=True)
+    ranker.history("b.com")
+    ranker.history("d.com")
+    assert list(ranker._history) == ["b.com", "d.com"]
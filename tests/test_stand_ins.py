@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+"""Tests for the offline benchmark stand-ins."""
+import json
+import urllib.request
+
+from benchmarks.stand_ins import StandInConfig, StandInServer
+from content_extractor import extract_main_text
+
+
+def fetch(url, data=None):
+    headers = {"Content-Type": "application/json"} if data else {}
+    request = urllib.request.Request(url, data=data, headers=headers)
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.read().decode("utf-8")
+
+
+def test_stand_ins_serve_search_articles_and_chat():
+    config = StandInConfig(search_latency=0, page_latency=0, llm_latency=0, page_failure_rate=0,
+                           page_size=2000)
+    with StandInServer(config) as server:
+        results = fetch(f"{server.base_url}/?q=solar+power")
+        assert results.count("<h2><a href=") == config.results_per_search
+        article = fetch(f"{server.base_url}/article/solar-power-1")
+        assert len(extract_main_text(article)) >= 1500
+
+        body = json.dumps({"model": "m", "messages": [
+            {"role": "user",
+             "content": 'create a comprehensive research plan\nUser Query: "solar power"'}
+        ]}).encode()
+        completion = json.loads(fetch(f"{server.base_url}/openai/v1/chat/completions", body))
+        assert completion["choices"][0]["message"]["content"].startswith("PRIMARY: solar power")
+        counts = server.counts
+        assert (counts["search"], counts["article"], counts["llm"]) == (1, 1, 1)